@@ -0,0 +1,82 @@
+"""Throughput of FrameDecoder against the old split-on-magic-bytes parsing, fed from memory and from a loopback socket.
+
+Run from the repository root: python benchmarks/bench_frame_decoder.py
+"""
+import socket
+import threading
+import time
+
+import numpy as np
+
+from pyjop.EntityBase import NPArray
+from pyjop.Network import FrameDecoder
+
+TICKS = 60
+CHUNK = 2**16
+
+
+def tick_frames(i: int):
+    """one tick of a busy level: sim time, a 256x256 float camera, a LiDAR scan and 50 trackers"""
+    return [
+        NPArray("SimEnvManager.Current.SimTime", np.asarray([i * 0.02], dtype=np.float32)),
+        NPArray("SmartCamera.cam.Camera", np.random.rand(256, 256, 4).astype(np.float32)),
+        NPArray("SmartLiDAR.lidar.LidarData", np.random.rand(1, 2048, 4).astype(np.float32)),
+    ] + [NPArray(f"SmartTracker.t{j}.Location", np.random.rand(3).astype(np.float32)) for j in range(50)]
+
+
+def split_parse(chunks):
+    """the parsing FrameDecoder replaced"""
+    datall = bytearray()
+    n = 0
+    for c in chunks:
+        datall += c
+        all_frames = datall.split(NPArray._MAGIC_BYTES)
+        all_arrs = [NPArray.from_msg(m) for m in all_frames if len(m) >= NPArray._HEADER_SIZE + 1 and int.from_bytes(m[:4], "little") == len(m[NPArray._HEADER_SIZE :])]
+        n += len(all_arrs)
+        datall = bytearray() + all_frames[-1] if len(all_arrs) != len(all_frames) else bytearray()
+    return n
+
+
+def decoder_parse(chunks):
+    decoder = FrameDecoder()
+    return sum(len(decoder.feed(c)) for c in chunks)
+
+
+def loopback_parse(stream: bytes):
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def serve():
+        conn, _ = server.accept()
+        conn.sendall(stream)
+        conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    client = socket.create_connection(server.getsockname())
+    decoder = FrameDecoder(CHUNK)
+    n = 0
+    while True:
+        k = client.recv_into(decoder.buffer())
+        if k == 0:
+            break
+        n += len(decoder.feed_buffer(k))
+    client.close()
+    server.close()
+    return n
+
+
+def measure(name: str, nbytes: int, fn, *args):
+    t = time.perf_counter()
+    frames = fn(*args)
+    dt = time.perf_counter() - t
+    print(f"{name:<24} {frames:>6} frames {nbytes / dt / 1e6:>8.0f} MB/s")
+
+
+if __name__ == "__main__":
+    stream = b"".join(f.pack_msg() for i in range(TICKS) for f in tick_frames(i))
+    chunks = [bytearray(stream[i : i + CHUNK]) for i in range(0, len(stream), CHUNK)]
+    print(f"stream of {len(stream) / 1e6:.0f} MB in {len(chunks)} chunks of {CHUNK} bytes")
+    measure("split on magic bytes", len(stream), split_parse, chunks)
+    measure("FrameDecoder", len(stream), decoder_parse, chunks)
+    measure("FrameDecoder loopback", len(stream), loopback_parse, stream)
@@ -0,0 +1,29 @@
+"""Cost of the line number bookkeeping every getter and setter does (EntityBase._get_line_number and _log_line_number), called from a user function.
+
+Run from the repository root: python benchmarks/bench_line_number.py
+"""
+import time
+
+from pyjop.EntityBase import EntityBase
+
+CALLS = 20000
+
+
+def log_line_numbers(n: int):
+    for _ in range(n):
+        EntityBase._log_line_number()
+
+
+def get_line_numbers(n: int):
+    for _ in range(n):
+        EntityBase._get_line_number()
+
+
+if __name__ == "__main__":
+    t = time.perf_counter()
+    log_line_numbers(CALLS)
+    print(f"_log_line_number {1e6 * (time.perf_counter() - t) / CALLS:.2f} us per call")
+    EntityBase._take_out_data()
+    t = time.perf_counter()
+    get_line_numbers(CALLS)
+    print(f"_get_line_number {1e6 * (time.perf_counter() - t) / CALLS:.2f} us per call, line {EntityBase._get_line_number()}")
@@ -0,0 +1,74 @@
+"""Round trip from a setter to the echoed reply against a loopback stand-in server, and the idle CPU of the process afterwards.
+
+Run from the repository root: python benchmarks/bench_round_trip.py
+"""
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import psutil
+
+from pyjop.EntityBase import EntityBase, NPArray
+from pyjop.Network import FrameDecoder, SimEnv
+
+SAMPLES = 200
+
+
+def serve(listener: socket.socket):
+    """echo every setPing as Pong right away and tick every 50 ms"""
+    conn, _ = listener.accept()
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    decoder = FrameDecoder()
+    sim_time = 0.01
+    conn.sendall(NPArray("SimEnvManager.Current.SimTime", np.asarray([sim_time], dtype=np.float32)).pack_msg()
+                 + NPArray("SmartTracker.t0.Pong", np.asarray([-1], dtype=np.float32)).pack_msg())
+    last_tick = time.monotonic()
+    conn.settimeout(0.001)
+    while True:
+        try:
+            n = conn.recv_into(decoder.buffer())
+            if n == 0:
+                break
+            replies = [NPArray("SmartTracker.t0.Pong", np.array(f.array_data)) for f in decoder.feed_buffer(n) if f.unique_name.endswith("setPing")]
+            if replies:
+                conn.sendall(b"".join(r.pack_msg() for r in replies))
+        except socket.timeout:
+            pass
+        except OSError:
+            break
+        if time.monotonic() - last_tick > 0.05:
+            sim_time += 0.05
+            last_tick = time.monotonic()
+            try:
+                conn.sendall(NPArray("SimEnvManager.Current.SimTime", np.asarray([sim_time], dtype=np.float32)).pack_msg())
+            except OSError:
+                break
+
+
+if __name__ == "__main__":
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    threading.Thread(target=serve, args=(listener,), daemon=True).start()
+    SimEnv.connect(port=listener.getsockname()[1])
+
+    latencies = []
+    for i in range(SAMPLES):
+        value = float(i)
+        t0 = time.perf_counter()
+        EntityBase._set_out_data("SmartTracker.t0.setPing", NPArray("SmartTracker.t0.setPing", np.asarray([value], dtype=np.float32)))
+        while EntityBase._in_dict["SmartTracker.t0.Pong"].get_float() != value:
+            time.sleep(0.0001)
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(0.003)
+    ms = np.asarray(latencies) * 1e3
+    print(f"\nround trip ms: median {np.median(ms):.2f} p90 {np.percentile(ms, 90):.2f} max {ms.max():.2f}")
+
+    process = psutil.Process()
+    c0 = process.cpu_times()
+    time.sleep(3)
+    c1 = process.cpu_times()
+    print(f"idle cpu, including the stand-in server thread: {((c1.user - c0.user) + (c1.system - c0.system)) / 3 * 100:.1f}%")
+    os._exit(0)
@@ -1,19 +1,28 @@
 # pip wheel . --no-deps
+import asyncio
 import base64
+import bisect
 import builtins
+import hashlib
+import heapq
+from contextlib import ContextDecorator
 from io import BytesIO
 import json
 import queue
 import random
+import socket
+import struct
+from collections import deque
 from itertools import count
 import threading
 
 builtins.print(".", end="")
 from PIL import Image
-from types import FrameType, ModuleType, SimpleNamespace
+from types import CodeType, FrameType, ModuleType, SimpleNamespace
 from typing import (
     Any,
     Callable,
+    Deque,
     Dict,
     Final,
     Generic,
@@ -26,18 +35,13 @@ from typing import (
 )
 import numpy as np
 builtins.print(".", end="")
-import skimage
-builtins.print(".", end="")
 import sys
 import time
 import encodings.utf_8_sig
-import skimage.transform
-import skimage.util
 builtins.print(".", end="")
-from datetime import datetime
 import inspect
+from datetime import datetime, timedelta, timezone
 from queue import Queue
-from inspect import currentframe, getframeinfo
 from matplotlib import colormaps
 
 from pyjop.Enums import Colors, VerbosityLevels
@@ -51,6 +55,8 @@ class NPArray:
     _NAME_LEN: Final = 128
     _PRE_HEADER: Final = 17
     _HEADER_SIZE: Final = _NAME_LEN + _PRE_HEADER
+    # 4bytes len, 4bytes w, 4bytes h, 4bytes c, 1byte dtype, 128 ascii bytes name
+    _HEADER_STRUCT: Final = struct.Struct(f"<IIIIB{_NAME_LEN}s")
 
     time_id_it = count(start = 0, step = 1)
 
@@ -58,72 +64,68 @@ class NPArray:
         self.unique_name = name
         self.array_data: np.ndarray = arr
         self.time_id = 0
+        self.sim_time = 0.0
+        self._decoded: Optional[Dict[str, Any]] = None
 
     @classmethod
     def from_msg(cls, msg_b):
         # skip 4 bytes if magic bytes still there
         if msg_b[:4] == NPArray._MAGIC_BYTES:
             msg_b = msg_b[4:]
-        msg_len = int.from_bytes(msg_b[:4], "little")
-        w = int.from_bytes(msg_b[4:8], "little")
-        h = int.from_bytes(msg_b[8:12], "little")
-        c = int.from_bytes(msg_b[12:16], "little")
-        if msg_b[16] == 0:
+        header = NPArray._HEADER_STRUCT.unpack_from(msg_b)
+        return NPArray._from_header(header, msg_b, NPArray._HEADER_SIZE)
+
+    @staticmethod
+    def _from_header(header: Tuple[int, int, int, int, int, bytes], buf, offset: int) -> "NPArray":
+        """build an NPArray from an already unpacked header. the array is a view into buf starting at offset, no bytes are copied."""
+        msg_len, w, h, c, dtype_id, name_b = header
+        if dtype_id == 0:
             dt = np.uint8
         else:
             dt = np.float32
-        name = str.strip(
-            msg_b[NPArray._PRE_HEADER : NPArray._HEADER_SIZE].decode("ascii")
-        )
-        msg_b = msg_b[NPArray._HEADER_SIZE : NPArray._HEADER_SIZE + msg_len]
+        name = name_b.decode("ascii").strip()
         if msg_len > 0:
-            arr = np.ndarray(shape=(h, w, c), dtype=dt, buffer=msg_b)
+            arr = np.ndarray(shape=(h, w, c), dtype=dt, buffer=buf, offset=offset)
         else:
             arr = np.zeros((1,1,1),dtype=dt)
-        nparr = NPArray(name, arr)
-        return nparr
+        return NPArray(name, arr)
 
-    def pack_msg(self) -> bytearray:
-        out = bytearray()
+    def pack_parts(self) -> Tuple[bytes, memoryview]:
+        """pack the frame header and return it together with a view of the payload. the payload is not copied if the array is already contiguous."""
         if self.array_data.dtype != np.uint8 and self.array_data.dtype != np.float32:
             self.array_data = self.array_data.astype(np.float32)
 
-        name = self.unique_name.ljust(NPArray._NAME_LEN, " ")[: NPArray._NAME_LEN]
-        arr = self.array_data.squeeze()
-        arr_b = arr.tobytes()
-
-        out += NPArray._MAGIC_BYTES  # 4 magic bytes
-        # 4bytes len
-        out += int.to_bytes(len(arr_b), 4, "little")
+        arr = np.ascontiguousarray(self.array_data.squeeze())
+        payload = memoryview(arr.reshape(-1).view(np.uint8))
         if len(arr.shape) == 0:
             arr = np.expand_dims(arr, 0)
-        # 4bytes w
-        out += int.to_bytes(arr.shape[0], 4, "little")
-        # 4bytes h
-        if len(arr.shape) > 1:
-            out += int.to_bytes(arr.shape[1], 4, "little")
-        else:
-            out += int.to_bytes(1, 4, "little")
-        # 4bytes c
-        if len(arr.shape) > 2:
-            out += int.to_bytes(arr.shape[2], 4, "little")
-        else:
-            out += int.to_bytes(1, 4, "little")
+        # w, h, c
+        w = arr.shape[0]
+        h = arr.shape[1] if len(arr.shape) > 1 else 1
+        c = arr.shape[2] if len(arr.shape) > 2 else 1
         # 1byte dtype
-        if arr.dtype == np.uint8:
-            out += b"\x00"
-        else:
-            out += b"\x01"
-        # fixed length name
-        # 128asci bytes name
-        out += name.encode("ascii")
-        # variable array
-        out += arr_b
-        return out
+        dtype_id = 0 if arr.dtype == np.uint8 else 1
+        # fixed length name, 128 ascii bytes
+        name = self.unique_name.ljust(NPArray._NAME_LEN, " ")[: NPArray._NAME_LEN].encode("ascii")
+        header = NPArray._MAGIC_BYTES + NPArray._HEADER_STRUCT.pack(len(payload), w, h, c, dtype_id, name)
+        return header, payload
+
+    def pack_msg(self) -> bytes:
+        header, payload = self.pack_parts()
+        return header + payload
 
     def get_string(self) -> str:
         return self.array_data.squeeze().tobytes().decode("ascii",errors='replace').strip()
 
+    def _memo(self, kind: str, decode: Callable[["NPArray"], Any]) -> Any:
+        """decode the payload once per kind. the receiver replaces the whole NPArray on every update, so memoized values never go stale."""
+        decoded = self._decoded
+        if decoded is None:
+            decoded = self._decoded = dict()
+        if kind not in decoded:
+            decoded[kind] = decode(self)
+        return decoded[kind]
+
     def get_json_dict(self) -> dict[str,Any]:
         js = {}
         raw = self.array_data.squeeze().tobytes().decode("utf-8")
@@ -178,6 +180,118 @@ class JoyfulException(Exception):
 
 T = TypeVar("T")
 
+class TickNotifier:
+    """Counter of received (or sent) ticks. The network threads signal it, waiting threads block on it instead of polling."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self.tick = 0
+        self.closed = False
+
+    def notify(self):
+        with self._cond:
+            self.tick += 1
+            self._cond.notify_all()
+
+    def close(self):
+        """wake all waiters for good, e.g. once the connection is lost"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def reset(self):
+        with self._cond:
+            self.closed = False
+
+    def wait(self, last_tick: int, timeout: Optional[float] = None) -> int:
+        """block until the counter moved past last_tick, the notifier is closed or the timeout (in seconds) expired. returns the current tick."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.tick != last_tick or self.closed, timeout)
+            return self.tick
+
+class SimTimeScheduler:
+    """Wakes threads sleeping until a target sim time. The receiving side calls update() once per new SimTime, which pops the sleepers that are due before the next tick.
+    Due sleepers sleep the rest of the way on the wall clock, predicted from the rate at which the sim time currently advances (i.e. the time dilation)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # [target sim time, seq, event, due] entries, ordered by target
+        self._sleepers: List[list] = []
+        self._seq = count()
+        self.sim_time = -1.0
+        self._received_ns = 0
+        self.rate = 1.0
+        """estimated sim seconds per wall second"""
+        self.interval = 0.0
+        """estimated wall seconds between two ticks"""
+        self.closed = False
+
+    def update(self, sim_time: float, now_ns: int):
+        """new sim time received at time.monotonic_ns() now_ns"""
+        with self._lock:
+            last_time, last_ns = self.sim_time, self._received_ns
+            self.sim_time, self._received_ns = sim_time, now_ns
+            if last_ns == 0:
+                return
+            if sim_time < last_time:
+                # the SimEnv was reset, keep the remaining sim time of all sleepers
+                shift = sim_time - last_time
+                for entry in self._sleepers:
+                    entry[0] += shift
+                return
+            dt = (now_ns - last_ns) / 1e9
+            if dt <= 0:
+                return
+            self.interval = dt if self.interval == 0 else 0.8 * self.interval + 0.2 * dt
+            rate = (sim_time - last_time) / dt
+            self.rate = rate if rate <= 0 or self.rate <= 0 else 0.8 * self.rate + 0.2 * rate
+            due = sim_time + self.rate * self.interval
+            while len(self._sleepers) > 0 and self._sleepers[0][0] <= due:
+                entry = heapq.heappop(self._sleepers)
+                entry[3] = True
+                entry[2].set()
+
+    def add(self, target: float) -> Optional[list]:
+        """register a sleeper for the target sim time. returns None if it is already due."""
+        with self._lock:
+            if self.closed or target <= self.sim_time:
+                return None
+            entry = [target, next(self._seq), threading.Event(), False]
+            heapq.heappush(self._sleepers, entry)
+            return entry
+
+    def wait(self, entry: Optional[list]) -> bool:
+        """block until the sleeper is due (returns True) or interrupted (returns False), e.g. to dispatch events"""
+        if entry is None:
+            return True
+        entry[2].wait()
+        with self._lock:
+            if not entry[3]:
+                entry[2].clear()
+                return False
+            remaining = 0.0
+            if self.rate > 0 and not self.closed:
+                elapsed = (time.monotonic_ns() - self._received_ns) / 1e9
+                remaining = min((entry[0] - self.sim_time) / self.rate - elapsed, self.interval)
+        if remaining > 0:
+            time.sleep(remaining)
+        return True
+
+    def interrupt(self):
+        """wake all sleepers without them being due"""
+        with self._lock:
+            for entry in self._sleepers:
+                entry[2].set()
+
+    def close(self):
+        """wake all sleepers for good, e.g. once the connection is lost"""
+        with self._lock:
+            self.closed = True
+            for entry in self._sleepers:
+                entry[3] = True
+                entry[2].set()
+            self._sleepers = []
+
 class BaseEventData:
     """Event data returned by several entities.
     """
@@ -201,112 +315,745 @@ class BaseEventData:
 
 
 
-class EntityBase(Generic[T]):
+class CommandQueue:
+    """Outgoing NPArrays in three priority lanes: control commands, telemetry (logs, line numbers, memory usage) and bulk data (large payloads). Within a lane commands keep the order they were queued in. Setting a key again replaces its pending command (last writer wins) and moves it to the end, appended commands are all kept. Guarded by EntityBase.sendlock."""
+
+    CONTROL: Final = 0
+    TELEMETRY: Final = 1
+    BULK: Final = 2
+    TELEMETRY_PROPS: Final = frozenset(("LogDebug", "LogImg", "LogLineNo", "MemUsg"))
+    BULK_BYTES: Final = 16384
+    # bytes of telemetry and bulk frames handed out per send opportunity, including what is still waiting in the socket buffers
+    LANE_BUDGETS: Final = (0, 32768, 65536)
+
+    def __init__(self) -> None:
+        self._lanes: Tuple[Dict[Any, NPArray], ...] = (dict(), dict(), dict())
+        self._append_counts: Dict[str, int] = dict()
+
+    def __len__(self) -> int:
+        return len(self._lanes[0]) + len(self._lanes[1]) + len(self._lanes[2])
+
+    @staticmethod
+    def _lane(k: str, arr: NPArray) -> int:
+        if k[k.rfind(".") + 1:] in CommandQueue.TELEMETRY_PROPS:
+            return CommandQueue.TELEMETRY
+        if arr.array_data.nbytes >= CommandQueue.BULK_BYTES:
+            return CommandQueue.BULK
+        return CommandQueue.CONTROL
+
+    def put(self, k: str, arr: NPArray, append=False, lane_id: Optional[int] = None) -> int:
+        """queue arr under key k, in the given lane or the one picked by _lane. returns the number of appends pending for k."""
+        lane = self._lanes[CommandQueue._lane(k, arr) if lane_id is None else lane_id]
+        if append:
+            lane[(k, arr.time_id)] = arr
+            n = self._append_counts.get(k, 0) + 1
+            self._append_counts[k] = n
+            return n
+        for other in self._lanes:
+            other.pop(k, None)
+        lane[k] = arr
+        return 0
+
+    def frames(self) -> List[NPArray]:
+        """all queued frames, lane by lane"""
+        return list(self._lanes[0].values()) + list(self._lanes[1].values()) + list(self._lanes[2].values())
+
+    def take(self, pending_bytes=0) -> List[NPArray]:
+        """remove and return all control frames and as many telemetry and bulk frames as fit into their lane budgets after pending_bytes. if nothing is pending, at least one frame per lane is returned, so frames larger than the budget still go out."""
+        frames = list(self._lanes[0].values())
+        self._lanes[0].clear()
+        for lane_id in (CommandQueue.TELEMETRY, CommandQueue.BULK):
+            lane = self._lanes[lane_id]
+            budget = CommandQueue.LANE_BUDGETS[lane_id] - pending_bytes
+            taken = []
+            for key, arr in lane.items():
+                size = arr.array_data.nbytes + NPArray._HEADER_SIZE + 4
+                if size > budget and (pending_bytes > 0 or len(taken) > 0):
+                    break
+                budget -= size
+                taken.append(key)
+                frames.append(arr)
+            for key in taken:
+                del lane[key]
+                if isinstance(key, tuple):
+                    self._append_counts[key[0]] -= 1
+        return frames
+
+    def merge(self, other: "CommandQueue", lane_id: Optional[int] = None):
+        """queue everything from other behind the commands queued so far, with the same replace and append rules. with lane_id all of it goes into that lane."""
+        for other_lane in other._lanes:
+            for key, arr in other_lane.items():
+                if isinstance(key, tuple):
+                    self.put(key[0], arr, True, lane_id)
+                else:
+                    self.put(key, arr, False, lane_id)
+
+
+class LogPipeline:
+    """Buffers log messages for the SimEnv so logging never blocks the caller. A message equal to the one before it is merged into "(repeated N times)", the buffer keeps at most MAX_PENDING messages between flushes and at most BYTES_PER_SECOND of log messages are sent. Messages beyond these limits are dropped and counted. The io thread flushes the buffer into the command queue once per tick."""
+
+    MAX_PENDING: Final = 256
+    BYTES_PER_SECOND: Final = 65536
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # [key, msg, color, log level or None, repeat count]
+        self._pending: Deque[List[Any]] = deque()
+        self._dropped = 0
+        self._window_start = 0.0
+        self._window_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, k: str, msg: str, col: Tuple[float, float, float], log_level: Optional[int] = None):
+        with self._lock:
+            if len(self._pending) > 0:
+                last = self._pending[-1]
+                if last[0] == k and last[1] == msg and last[2] == col and last[3] == log_level:
+                    last[4] += 1
+                    return
+            if len(self._pending) >= LogPipeline.MAX_PENDING:
+                self._dropped += 1
+                return
+            self._pending.append([k, msg, col, log_level, 1])
+
+    def flush(self):
+        """encode all buffered messages that fit into the byte budget and queue them as LogDebug appends"""
+        with self._lock:
+            pending = self._pending
+            self._pending = deque()
+            if len(pending) == 0 and self._dropped == 0:
+                return
+        # encoding runs outside the lock, the drop counter and byte window are only changed under it
+        payloads: List[Tuple[str, bytes]] = []
+        for k, msg, col, log_level, repeats in pending:
+            if repeats > 1:
+                msg = f"{msg} (repeated {repeats} times)"
+            payloads.append((k, LogPipeline._encode(msg, col, log_level)))
+        frames: List[NPArray] = []
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_bytes = 0
+            for k, payload in payloads:
+                if self._window_bytes + len(payload) > LogPipeline.BYTES_PER_SECOND:
+                    self._dropped += 1
+                    continue
+                self._window_bytes += len(payload)
+                frames.append(NPArray(k, np.frombuffer(payload, dtype=np.uint8)))
+            if self._dropped > 0 and self._window_bytes < LogPipeline.BYTES_PER_SECOND:
+                payload = LogPipeline._encode(f"{self._dropped} log messages dropped, too many messages", _parse_color(Colors.Yellow), int(VerbosityLevels.Important))
+                self._window_bytes += len(payload)
+                frames.append(NPArray("SimEnvManager.Current.LogDebug", np.frombuffer(payload, dtype=np.uint8)))
+                self._dropped = 0
+        if len(frames) == 0:
+            return
+        EntityBase.sendlock.acquire()
+        for nparr in frames:
+            nparr.time_id = next(NPArray.time_id_it)
+            EntityBase._out_queue.put(nparr.unique_name, nparr, True)
+        EntityBase.sendlock.release()
+
+    @staticmethod
+    def _encode(msg: str, col: Tuple[float, float, float], log_level: Optional[int]) -> bytes:
+        jsonDict: Dict[str, Any] = {"msg": msg, "col": col}
+        if log_level is not None:
+            jsonDict["level"] = log_level
+        return json.dumps(jsonDict, ensure_ascii=False).encode("utf-8")
+
+
+class ImageLogEncoder:
+    """Converts images for the SimEnv log to 256x256 uint8 with nearest neighbour sampling. The gather indices are cached per input shape, so encoding a frame is a single np.take. Every frame gets a fresh output array because queued frames are sent without copying."""
+
+    SIZE: Final = 256
+    _MAX_CACHED: Final = 16
+    _index_maps: Dict[Tuple[int, int, int], np.ndarray] = dict()
+
+    @staticmethod
+    def _index_map(h: int, w: int, c: int) -> np.ndarray:
+        key = (h, w, c)
+        idx = ImageLogEncoder._index_maps.get(key, None)
+        if idx is None:
+            size = ImageLogEncoder.SIZE
+            # same sampling positions as skimage.transform.resize with order=0
+            rows = np.minimum(((np.arange(size) + 0.5) * (h / size)).astype(np.intp), h - 1)
+            cols = np.minimum(((np.arange(size) + 0.5) * (w / size)).astype(np.intp), w - 1)
+            pixels = rows[:, None] * w + cols[None, :]
+            # rgb gets an alpha channel, its index is overwritten after the take
+            c_out = 4 if c == 3 else c
+            idx = (pixels[:, :, None] * c + np.arange(c_out)).astype(np.intp)
+            if len(ImageLogEncoder._index_maps) >= ImageLogEncoder._MAX_CACHED:
+                ImageLogEncoder._index_maps.clear()
+            ImageLogEncoder._index_maps[key] = idx
+        return idx
+
+    @staticmethod
+    def encode(img: np.ndarray) -> np.ndarray:
+        """(256,256,c) uint8 copy of a (h,w) or (h,w,c) image. rgb images get an opaque alpha channel, float and other non uint8 images are scaled by 255."""
+        if len(img.shape) == 2:
+            img = img[:, :, None]
+        h, w, c = img.shape
+        src = np.ascontiguousarray(img).reshape(-1)
+        if src.dtype == np.bool_:
+            src = src.view(np.uint8)
+            out = np.take(src, ImageLogEncoder._index_map(h, w, c), mode="clip")
+            out *= 255
+        elif src.dtype == np.uint8:
+            out = np.take(src, ImageLogEncoder._index_map(h, w, c), mode="clip")
+        else:
+            scaled = np.take(src, ImageLogEncoder._index_map(h, w, c), mode="clip").astype(np.float32)
+            scaled *= 255
+            np.clip(scaled, 0, 255, out=scaled)
+            out = scaled.astype(np.uint8)
+        if c == 3:
+            out[:, :, 3] = 255
+        return out
+
+
+class CommandBatch(ContextDecorator):
+    """Collects all commands queued by the current thread in the current Session inside a with block (or decorated function) and queues them together on exit, all in the control lane so they go out in one write. Batches can be nested, only the outermost one queues its commands. If the block raises, its commands are dropped."""
+
+    def __init__(self, align_to_tick=False) -> None:
+        self.align_to_tick = align_to_tick
+
+    @staticmethod
+    def _stack() -> List[CommandQueue]:
+        stacks = Session._local.session._batch_stacks
+        stack = getattr(stacks, "stack", None)
+        if stack is None:
+            stack = stacks.stack = []
+        return stack
+
+    @staticmethod
+    def _active() -> Optional[CommandQueue]:
+        """the queue of the innermost batch of the current thread in the current session, if any"""
+        stack = getattr(Session._local.session._batch_stacks, "stack", None)
+        return stack[-1] if stack else None
+
+    def __enter__(self) -> "CommandBatch":
+        CommandBatch._stack().append(CommandQueue())
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        stack = CommandBatch._stack()
+        batch_queue = stack.pop()
+        if exc_type is not None:
+            # the dropped commands were never sent, sending the same values again must not be deduplicated
+            EntityBase._forget_sent(batch_queue.frames())
+            return False
+        if len(batch_queue) == 0:
+            return False
+        EntityBase.sendlock.acquire()
+        if len(stack) > 0:
+            stack[-1].merge(batch_queue)
+        elif self.align_to_tick:
+            EntityBase._tick_aligned.append(batch_queue)
+        else:
+            EntityBase._out_queue.merge(batch_queue, CommandQueue.CONTROL)
+        EntityBase.sendlock.release()
+        if len(stack) == 0 and not self.align_to_tick:
+            EntityBase._wakeup_sender()
+        return False
+
+
+class SensorHistory:
+    """Fixed-size ring buffer of the values a sensor property was received with and the sim times they were received at. A value received again at the same sim time replaces the previous one."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._values: Optional[np.ndarray] = None
+        self._times = np.zeros(self.capacity, dtype=np.float64)
+        self._count = 0
+
+    def record(self, arr: np.ndarray, sim_time: float):
+        flat = arr.reshape(-1)
+        with self._lock:
+            if self._values is None or self._values.shape[1] != flat.shape[0] or self._values.dtype != flat.dtype:
+                # first value or the payload changed its layout: start over
+                self._values = np.zeros((self.capacity, flat.shape[0]), dtype=flat.dtype)
+                self._count = 0
+            if self._count > 0 and self._times[(self._count - 1) % self.capacity] == sim_time:
+                i = (self._count - 1) % self.capacity
+            else:
+                i = self._count % self.capacity
+                self._count += 1
+            self._values[i] = flat
+            self._times[i] = sim_time
+
+    def get(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """copies of the last n values and their sim times, oldest first"""
+        with self._lock:
+            k = min(n, self._count, self.capacity)
+            if self._values is None:
+                return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float64)
+            idx = np.arange(self._count - k, self._count) % self.capacity
+            return self._values.take(idx, axis=0), self._times.take(idx)
+
+    def value_at(self, sim_time: float) -> Optional[np.ndarray]:
+        """copy of the last value received at or before sim_time, None if there is none in the buffer"""
+        values, times = self.get(self.capacity)
+        i = int(np.searchsorted(times, sim_time, side="right")) - 1
+        if i < 0:
+            return None
+        return values[i]
+
+
+def _copy_channels(src: np.ndarray, out: np.ndarray, channels: int):
+    """copy the first channels of a received HxWxC image into out without temporaries, BGR becomes RGB for 3 channels"""
+    if channels <= 1:
+        np.copyto(out, src[:, :, 0])
+        return
+    # one strided plane copy per channel, np.copyto with a reversed channel axis is 4x slower
+    for i, c in enumerate((2, 1, 0) if channels == 3 else (0, 1)):
+        out[:, :, i] = src[:, :, c]
+
+
+class FrameRing:
+    """Small ring of preallocated image buffers for one camera property and channel count. Every newly received frame is copied into the next slot exactly once, already converted to the requested channels, and handed out as a read-only view with an increasing frame id. A view stays valid until slots - 1 newer frames arrived."""
+
+    def __init__(self, slots=3) -> None:
+        self.slots = max(2, int(slots))
+        self.frame_id = 0
+        self._buffers: List[np.ndarray] = []
+        self._next = 0
+        self._source: Optional[NPArray] = None
+        self._view: Optional[np.ndarray] = None
+
+    def update(self, nparr: NPArray, channels: int) -> Tuple[int, np.ndarray]:
+        """frame id and read-only view of the frame in nparr, copied only if nparr was not seen last time"""
+        if nparr is self._source:
+            return self.frame_id, self._view
+        src = nparr.array_data
+        shape = src.shape[:2] if channels <= 1 else src.shape[:2] + (channels,)
+        if not self._buffers or self._buffers[0].shape != shape or self._buffers[0].dtype != src.dtype:
+            # first frame or the resolution changed: reallocate all slots
+            self._buffers = [np.empty(shape, dtype=src.dtype) for _ in range(self.slots)]
+            self._next = 0
+        out = self._buffers[self._next]
+        self._next = (self._next + 1) % self.slots
+        _copy_channels(src, out, channels)
+        view = out.view()
+        view.flags.writeable = False
+        self.frame_id += 1
+        self._source, self._view = nparr, view
+        return self.frame_id, view
+
+
+class EntityIndex:
+    """Name-sorted entity lists per class, maintained as entities appear and expire. Every entity is listed under its exact class and under every EntityBase class in its MRO. Lists are replaced instead of mutated, so readers can use them without locking."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._exact: Dict[type, List["EntityBase"]] = dict()
+        self._derived: Dict[type, List["EntityBase"]] = dict()
+
+    @staticmethod
+    def _insert(index: Dict[type, List["EntityBase"]], cls: type, entity: "EntityBase"):
+        ents = list(index.get(cls, ()))
+        bisect.insort(ents, entity, key=lambda x: x.entity_name)
+        index[cls] = ents
+
+    @staticmethod
+    def _remove(index: Dict[type, List["EntityBase"]], cls: type, entity: "EntityBase"):
+        ents = [x for x in index.get(cls, ()) if x is not entity]
+        if ents:
+            index[cls] = ents
+        else:
+            index.pop(cls, None)
+
+    def add(self, entity: "EntityBase"):
+        with self._lock:
+            EntityIndex._insert(self._exact, entity.__class__, entity)
+            for cls in entity.__class__.__mro__:
+                if issubclass(cls, EntityBase):
+                    EntityIndex._insert(self._derived, cls, entity)
+
+    def remove(self, entity: "EntityBase"):
+        with self._lock:
+            EntityIndex._remove(self._exact, entity.__class__, entity)
+            for cls in entity.__class__.__mro__:
+                if issubclass(cls, EntityBase):
+                    EntityIndex._remove(self._derived, cls, entity)
+
+    def get(self, cls: type, find_derived=False) -> Sequence["EntityBase"]:
+        """name-sorted entities of exactly cls, or of cls and its subclasses if find_derived. do not mutate the result."""
+        if find_derived or cls is EntityBase:
+            return self._derived.get(cls, ())
+        return self._exact.get(cls, ())
+
+
+class _SessionLocal(threading.local):
+    session: "Session"
+    outer: Optional[Tuple["Session", Any]] = None  # sessions of the enclosing with blocks
+
+
+def _session_attribute(name: str) -> property:
+    def fget(cls):
+        return getattr(Session._local.session, name)
+    def fset(cls, value):
+        setattr(Session._local.session, name, value)
+    return property(fget, fset)
+
+
+def _session_scoped(*names: str) -> type:
+    """metaclass that redirects the given class attributes to the Session current in the calling thread, on the class as well as on its instances"""
+    def __new__(mcls, cls_name, bases, namespace, **kwargs):
+        if not any(isinstance(base, mcls) for base in bases):
+            # instances do not see properties of the metaclass, give them their own
+            for name in names:
+                namespace.setdefault(name, _session_attribute(name))
+        return type.__new__(mcls, cls_name, bases, namespace, **kwargs)
+    attrs: Dict[str, Any] = {name: _session_attribute(name) for name in names}
+    attrs["__new__"] = __new__
+    return type("SessionScoped", (type,), attrs)
+
+
+# wall clock time (naive utc like datetime.utcnow()) that time.monotonic_ns() == 0 corresponds to
+_MONOTONIC_EPOCH = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(microseconds=time.monotonic_ns() // 1000)
+
+
+def _utc_from_monotonic(ns: int) -> datetime:
+    """naive utc datetime of a time.monotonic_ns() value. the same value always gives the same datetime."""
+    return _MONOTONIC_EPOCH + timedelta(microseconds=ns // 1000)
+
+
+class _UtcFromNs:
+    """read-only datetime view of a time.monotonic_ns() class attribute, on the class as well as on its instances"""
+
+    def __init__(self, ns_name: str) -> None:
+        self.ns_name = ns_name
+
+    def __get__(self, obj, owner=None) -> datetime:
+        return _utc_from_monotonic(getattr(owner if owner is not None else type(obj), self.ns_name))
+
+
+class Session:
+    """One connection to a SimEnv with its own entity and sensor stores, outgoing commands and tick notifiers. Scripts talking to a single SimEnv always use the default session and never need this.
+    To talk to several SimEnv instances from one process, create one session per instance and make all calls for an instance inside a `with session:` block. The session is current for the calling thread only, entities found inside a session must only be used inside that session.
+
+    Example:
+        >>>
+        sessions = [Session(), Session()]
+        for session, port in zip(sessions, (18189, 18190)):
+            with session:
+                SimEnv.connect(port=port)
+        for session in sessions:
+            with session:
+                print(SimEnvManager.first().get_sim_time())
+    """
+
+    _local = _SessionLocal()
+    default: "Session"
+
+    def __init__(self) -> None:
+        # connection, see SimEnv and SockAPIClient
+        self._is_connected = False
+        self._client_socket: Optional[socket.socket] = None
+        self._async_client = None
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = None
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._wakeup_pending = False
+        self._wakeup_sender: Callable[[], None] = lambda: None
+        self._last_sim_time = -10.0
+        self.main_counter = 0
+        self._receive_ticks = TickNotifier()
+        self._send_ticks = TickNotifier()
+        self._sim_scheduler = SimTimeScheduler()
+        self._batch_stacks = threading.local()  # open CommandBatch queues per thread
+        # see SimEnv.set_command_dedup
+        self._dedup_enabled = False
+        self._dedup_refresh_interval = 1.0
+        # (entity class, handler) registered with EntityBase.on_entity_removed, kept when reconnecting
+        self._removal_handlers: List[Tuple[Type["EntityBase"], Callable[[Any, float], None]]] = []
+        self.reset()
+
+    def reset(self):
+        """empty all stores and queues, e.g. before connecting"""
+        self._out_queue = CommandQueue()
+        self._tick_aligned: List[CommandQueue] = []
+        self._log_pipeline = LogPipeline()
+        self._last_sent: Dict[str, Tuple[bytes, float]] = dict()
+        self._in_dict: Dict[str, NPArray] = dict()
+        self._entity_dict: Dict[str, "EntityBase"] = dict()
+        self._entity_index = EntityIndex()
+        # (deadline_ns, seq, fullname, entity) min-heap, deadlines are refreshed lazily when popped
+        self._expiry_heap: List[Tuple[int, int, str, "EntityBase"]] = []
+        self._removed_queue: Queue["EntityBase"] = Queue()
+        self._event_queue: Queue[Tuple[NPArray, Callable[[Any, float, Any], None]]] = Queue()
+        self._routes: Dict[str, Optional[Tuple[str, str, Optional[Type["EntityBase"]], bool]]] = dict()
+        self._histories: Dict[str, SensorHistory] = dict()
+        self._frame_rings: Dict[Tuple[str, int], FrameRing] = dict()  # per property and channel count
+        # (time.time_ns() of the last call, calls in a row) per property for the setter and getter rate limits
+        self._out_time_dict: Dict[str, Tuple[int, int]] = dict()
+        self._in_time_dict: Dict[str, Tuple[int, int]] = dict()
+        # line number last sent to the SimEnv and the receive tick it was sent in
+        self._last_line_no = -1
+        self._last_line_tick = -1
+        self._receive_ticks.reset()
+        self._send_ticks.reset()
+        self._sim_scheduler.close()
+        self._sim_scheduler = SimTimeScheduler()
+        # lockstep stepping, see SimEnvManager.step
+        self._lockstep = False
+        self._step_remaining = 0
+        self._step_dilation = 1.0
+        # time.monotonic_ns() of the last received tick and the last send
+        self.last_receive_ns = time.monotonic_ns()
+        self.last_send_ns = time.monotonic_ns()
+
+    @staticmethod
+    def current() -> "Session":
+        """the session of the innermost `with session:` block of the calling thread, the default session otherwise"""
+        return Session._local.session
+
+    def bind_thread(self):
+        """make this the session of the calling thread for good, used by the io threads"""
+        Session._local.session = self
+
+    def __enter__(self) -> "Session":
+        local = Session._local
+        local.outer = (local.session, local.outer)
+        local.session = self
+        return self
+
+    def __exit__(self, *exc):
+        local = Session._local
+        local.session, local.outer = local.outer
+
+    def close(self):
+        """release the wakeup sockets of this session once it is disconnected"""
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+
+Session.default = _SessionLocal.session = Session()
+
+
+class EntityBase(Generic[T], metaclass=_session_scoped(
+        "_out_queue", "_log_pipeline", "_tick_aligned", "_last_sent", "_in_dict", "_entity_dict", "_entity_index",
+        "_expiry_heap", "_removed_queue", "_event_queue", "_routes", "_histories", "_frame_rings", "_receive_ticks",
+        "_send_ticks", "_sim_scheduler", "_lockstep", "_step_remaining", "_step_dilation", "last_receive_ns",
+        "last_send_ns", "_wakeup_sender", "_event_loop", "_dedup_enabled", "_dedup_refresh_interval", "_out_time_dict",
+        "_in_time_dict", "_removal_handlers", "_last_line_no", "_last_line_tick")):
     """Base class for all entities in the SimEnv. Use Find or FindAll to get the entities you want to control and program them."""
 
-    _out_dict: Dict[str, List[NPArray]] = dict()
-    _out_time_dict: Dict[str, Tuple[int,int]] = dict()
-    _in_time_dict: Dict[str, Tuple[int,int]] = dict()
-    _in_dict: Dict[str, NPArray] = dict()
-    _entity_dict: Dict[str, "EntityBase"] = dict()
+    # the entity and sensor stores, command queues and tick notifiers are attributes of the current Session
+    last_receive_at = _UtcFromNs("last_receive_ns")
+    """utc time of the last tick received from the SimEnv, see last_receive_ns for the time.monotonic_ns() value"""
+    last_send_at = _UtcFromNs("last_send_ns")
+    """utc time commands were last sent to the SimEnv, see last_send_ns for the time.monotonic_ns() value"""
+    _expiry_seq = count()
     _custom_classes: Dict[str, Type["EntityBase"]] = dict()
+    # values per entity for each scatter kind, named like the _set_* helpers
+    _SCATTER_KINDS: Final = {"float": 1, "vector3d": 3, "int": 1, "bool": 1, "uint8": 1}
     _BLANK_IMAGE: Final = np.zeros((64, 64, 3), dtype=np.uint8)
     _TIMEOUT: Final = 5
-    last_receive_at = datetime.utcnow()
-
-    last_send_at = datetime.utcnow()
+    _VALID_NS: Final = 3_000_000_000
     _is_debug_paused = False
+    _pyjop_code: Dict[CodeType, bool] = dict()
 
     sendlock = threading.Lock()
 
-    _event_queue: Queue[Tuple[NPArray,Callable[[T,float, Any],None]]] = Queue()
-
     @staticmethod
-    def _set_out_data(k:str, arr:NPArray, append=False, max_appends=0):
+    def _set_out_data(k:str, arr:NPArray, append=False, max_appends=0, force=False):
+        session = Session._local.session
+        if session._dedup_enabled and not append and not force and CommandQueue._lane(k, arr) == CommandQueue.CONTROL and EntityBase._is_redundant(k, arr):
+            return
+        batch_queue = CommandBatch._active()
         EntityBase.sendlock.acquire()
         arr.time_id = next(NPArray.time_id_it)
-        needs_await = False
-        if append:
-            if k not in EntityBase._out_dict:
-                EntityBase._out_dict[k] = [arr]
-            else:
-                EntityBase._out_dict[k].append(arr) #TODO change append to also allow specific number of max appends
-                if max_appends>0 and len(EntityBase._out_dict[k]) > max_appends:
-                    needs_await = True
-        else:
-            EntityBase._out_dict[k] = [arr]
+        num_appends = (session._out_queue if batch_queue is None else batch_queue).put(k, arr, append)
+        needs_await = max_appends > 0 and num_appends > max_appends
         EntityBase.sendlock.release()
+        if batch_queue is None:
+            session._wakeup_sender()
         if needs_await:
             _dispatch_events()
             await_receive()
-        if not append and not k.startswith("SimEnvManager.Current"):
+        if not append and not session._lockstep and not k.startswith("SimEnvManager.Current"):
             t0,c0 = 0,0
-            if k in EntityBase._out_time_dict:
-                t0,c0 = EntityBase._out_time_dict[k]
+            out_time_dict = session._out_time_dict
+            if k in out_time_dict:
+                t0,c0 = out_time_dict[k]
             t1 = time.time_ns()
             if t1 < t0 + 3*1e6: #3ms
-                EntityBase._out_time_dict[k] = (t1,c0+1)
+                out_time_dict[k] = (t1,c0+1)
                 if c0 > 20:
                     EntityBase._log_debug_static(f"Setter rate limit: use sleep() or SimEnv.run_main() to repeatedly call commands like '{k}'", Colors.Yellow)
                     _dispatch_events()
                     await_receive()
             else:
-                EntityBase._out_time_dict[k] = (t1,0)
+                out_time_dict[k] = (t1,0)
                 
 
     @staticmethod
-    def _sync_incoming_data(nparr: NPArray):
-        
-        if nparr.unique_name.count(".") != 2:
+    def _queue_time_dilation(dilation: float):
+        k = "SimEnvManager.Current.setTimeDilation"
+        EntityBase._set_out_data(k, NPArray(k, np.asarray([dilation], dtype=np.float32)), force=True)
+
+    @staticmethod
+    def _count_lockstep_tick():
+        """called by the receiving side for every tick that advanced the sim time. acknowledges each tick of a step and pauses the SimEnv with the last one."""
+        if not EntityBase._lockstep or EntityBase._step_remaining <= 0:
             return
-        # get identifiers
-        type_name, entity_name, prop_name = nparr.unique_name.split(".")
-        fullname = type_name + "." + entity_name
-            
+        remaining = EntityBase._step_remaining - 1
+        EntityBase._queue_time_dilation(EntityBase._step_dilation if remaining > 0 else 0.0)
+        # only now the script may queue its next step, which must not be replaced by this pause
+        EntityBase._step_remaining = remaining
+
+    @staticmethod
+    def _is_redundant(k: str, arr: NPArray) -> bool:
+        """true if the same payload was queued for k within the refresh interval. otherwise remembers this payload as the last one sent."""
+        digest = EntityBase._digest(arr)
+        now = time.monotonic()
+        last = EntityBase._last_sent.get(k, None)
+        if last is not None and last[0] == digest and now - last[1] < EntityBase._dedup_refresh_interval:
+            return True
+        EntityBase._last_sent[k] = (digest, now)
+        return False
+
+    @staticmethod
+    def _digest(arr: NPArray) -> bytes:
+        """hash of the payload, computed on the array buffer without copying it"""
+        h = hashlib.blake2b(arr.array_data.dtype.char.encode("ascii"), digest_size=16)
+        h.update(memoryview(np.ascontiguousarray(arr.array_data)).cast("B"))
+        return h.digest()
+
+    @staticmethod
+    def _forget_sent(frames: Sequence[NPArray]):
+        """drop the dedup entries of frames that were queued but will never be sent"""
+        last_sent = EntityBase._last_sent
+        for nparr in frames:
+            last = last_sent.get(nparr.unique_name, None)
+            if last is not None and last[0] == EntityBase._digest(nparr):
+                last_sent.pop(nparr.unique_name, None)
+
+    @staticmethod
+    def _take_out_data(pending_bytes: Optional[int] = None) -> List[NPArray]:
+        """return the frames to send next, control commands first. without pending_bytes everything queued is taken by swapping in an empty command queue, otherwise the telemetry and bulk lanes are limited to their byte budgets after the bytes still pending."""
+        EntityBase.sendlock.acquire()
+        if pending_bytes is not None:
+            frames = EntityBase._out_queue.take(pending_bytes)
+            EntityBase.sendlock.release()
+            return frames
+        out_queue = EntityBase._out_queue
+        EntityBase._out_queue = CommandQueue()
+        EntityBase.sendlock.release()
+        return out_queue.frames()
+
+    @staticmethod
+    def _release_tick_aligned() -> bool:
+        """queue the batches that waited for the next tick. returns true if there were any."""
+        if len(EntityBase._tick_aligned) == 0:
+            return False
+        EntityBase.sendlock.acquire()
+        for batch_queue in EntityBase._tick_aligned:
+            EntityBase._out_queue.merge(batch_queue, CommandQueue.CONTROL)
+        EntityBase._tick_aligned = []
+        EntityBase.sendlock.release()
+        return True
+
+    @staticmethod
+    def _resolve_route(unique_name: str) -> Optional[Tuple[str, str, Optional[Type["EntityBase"]], bool]]:
+        """split an incoming unique name into (fullname, entity name, entity class, is event). None if the name is malformed, the class is None if unknown."""
+        if unique_name.count(".") != 2:
+            return None
+        type_name, entity_name, prop_name = unique_name.split(".")
+        # try custom entities first
+        cls = EntityBase._custom_classes.get(type_name, None)
+        if cls is None:
+            cls = getattr(sys.modules["pyjop.EntityClasses"], type_name, None)
+            if not (inspect.isclass(cls) and issubclass(cls, EntityBase)):
+                cls = None
+        return (type_name + "." + entity_name, entity_name, cls, prop_name.startswith("_event"))
+
+    @staticmethod
+    def _sync_incoming_data(nparr: NPArray, now = 0, sim_time = 0.0):
+        # every unique name is resolved once, later frames only do dict lookups
+        unique_name = nparr.unique_name
+        session = Session._local.session
+        route = session._routes.get(unique_name, False)
+        if route is False:
+            route = EntityBase._resolve_route(unique_name)
+            session._routes[unique_name] = route
+        if route is None:
+            return
+        fullname, entity_name, cls, is_event = route
 
         #ensure is in entity dict
-        if fullname in EntityBase._entity_dict:
+        entity = session._entity_dict.get(fullname, None)
+        if entity is not None:
             # update sync timestamp
-            EntityBase._entity_dict[fullname].last_sync_utc = datetime.utcnow()
-        # add instance to entity dict if not exists. try custom entities first
-        elif type_name in EntityBase._custom_classes:
+            entity.last_sync_ns = now or time.monotonic_ns()
+        elif cls is not None:
+            # add instance to entity dict if not exists
             try:
-                # get custom class as provided in custom classes
-                customcls = EntityBase._custom_classes[type_name]
-                customcls(entity_name, synccall="internal")
+                entity = cls(entity_name, synccall="internal")
             except:
                 pass
-                # print(f"ERROR {type_name} not found! please add as custom class derived from EntityBase and import into your main module")
-        else:
-            try:
-                cls = getattr(sys.modules["pyjop.EntityClasses"], type_name)
-                # assert inspect.isclass(cls) and  issubclass(cls, EntityBase)
-                cls(entity_name, synccall="internal")
-            except:
-                pass
-                # print(f"ERROR {type_name} not found! please add as custom class derived from EntityBase and import into your main module")
         # save type and name of all incoming entities (what about entities without sensors? should send ping and save timestamp)
 
-        if prop_name.startswith("_event"):
-            #print(f"received event {nparr.unique_name} {fullname in EntityBase._entity_dict}")
-            if fullname in EntityBase._entity_dict and nparr.unique_name in EntityBase._entity_dict[fullname].event_handlers:
-                #print(f"event handler there")
+        if is_event:
+            if entity is not None and unique_name in entity.event_handlers:
                 #put an event in queue
-                entity = EntityBase._entity_dict[fullname]
-                for listener in entity.event_handlers[nparr.unique_name]:
-                    entity._event_queue.put((nparr,listener))
-                    #print(f"enqueue event for entity")
-
-            
+                for listener in entity.event_handlers[unique_name]:
+                    session._event_queue.put((nparr,listener))
         else:
             #replicate value
-            EntityBase._in_dict[nparr.unique_name] = nparr
+            nparr.sim_time = sim_time
+            session._in_dict[unique_name] = nparr
+            history = session._histories.get(unique_name, None)
+            if history is not None:
+                history.record(nparr.array_data, sim_time)
         
         
     @staticmethod
     def _clean_entity_dict():
-        items = EntityBase._entity_dict.copy().items()
-        EntityBase._entity_dict = {k:v for k, v in items if v.is_valid}
+        """drop entities that were not synced for _VALID_NS. only heap entries whose deadline passed are looked at, entities synced since then are pushed again with their new deadline."""
+        heap = EntityBase._expiry_heap
+        if len(heap) == 0:
+            return
+        now = time.monotonic_ns()
+        if heap[0][0] > now or _debugger_is_active():
+            return
+        while len(heap) > 0 and heap[0][0] <= now:
+            _, _, fullname, entity = heapq.heappop(heap)
+            if EntityBase._entity_dict.get(fullname, None) is not entity:
+                continue
+            deadline = entity.last_sync_ns + EntityBase._VALID_NS
+            if deadline > now:
+                heapq.heappush(heap, (deadline, next(EntityBase._expiry_seq), fullname, entity))
+                continue
+            EntityBase._entity_dict.pop(fullname, None)
+            EntityBase._entity_index.remove(entity)
+            EntityBase._removed_queue.put(entity)
+
+    @staticmethod
+    def _push_expiry(entity: "EntityBase"):
+        heapq.heappush(EntityBase._expiry_heap, (entity.last_sync_ns + EntityBase._VALID_NS, next(EntityBase._expiry_seq), entity._build_name(), entity))
+
+    @classmethod
+    def on_entity_removed(cls, handler: Callable[[T, float], None]):
+        """Event called when an entity of the current type (or a derived type) was removed from the SimEnv of the current Session, i.e. it did not send any data for 3 seconds.
+        The handler receives the removed entity and the current sim time.
+
+        Args:
+            handler (Callable[[T, float], None]): Function called on the main thread with the removed entity and the sim time.
+
+        Example:
+            >>>
+            def handle_removed(entity, gametime):
+                print(f"{entity.entity_name} was removed at {gametime:.1f}")
+
+            ConveyorBelt.on_entity_removed(handle_removed)
+        """
+        EntityBase._removal_handlers.append((cls, handler))
 
     @classmethod
     def find_all(cls, find_derived=False, suppress_warnings=False) -> List[T]:
@@ -328,14 +1075,8 @@ class EntityBase(Generic[T]):
 
     @classmethod
     def _find_all_internal(cls, find_derived=False):
-        items = EntityBase._entity_dict.copy().items()
         EntityBase._log_line_number()
-        if find_derived or cls == EntityBase:
-            all_ents = [v for k, v in items if isinstance(v, cls) and v.is_valid]
-        else:
-            all_ents = [v for k, v in items if v.__class__ == cls and v.is_valid]
-        all_ents.sort(key=lambda x: x.entity_name)
-        return all_ents
+        return list(EntityBase._entity_index.get(cls, find_derived))
 
     @classmethod
     def find(cls, entity_name: str, suppress_warnings=False) -> T:
@@ -348,12 +1089,13 @@ class EntityBase(Generic[T]):
         """
         fullname = cls.__name__ + "." + entity_name
         EntityBase._log_line_number()
-        if fullname not in EntityBase._entity_dict and suppress_warnings==False:
-            EntityBase._log_debug_static(
-                f"Cannot find entity '{entity_name}'", (1, 1, 0)
-            )
+        v = EntityBase._entity_dict.get(fullname, None)
+        if v is None:
+            if suppress_warnings==False:
+                EntityBase._log_debug_static(
+                    f"Cannot find entity '{entity_name}'", (1, 1, 0)
+                )
             return None
-        v = EntityBase._entity_dict[fullname]
         if isinstance(v, cls) and v.is_valid:
             return v
         if suppress_warnings==False:
@@ -371,10 +1113,11 @@ class EntityBase(Generic[T]):
             conv = ConveyorBelt.first() #first conveyor belt
             sim = SimEnvManager.first() #first (and only) simenv manager
         """
-        all = cls._find_all_internal()
+        EntityBase._log_line_number()
+        all = EntityBase._entity_index.get(cls)
         if len(all) > 0:
             return all[0]
-        all = cls._find_all_internal(True)
+        all = EntityBase._entity_index.get(cls, True)
         if len(all) > 0:
             return all[0]
         if suppress_warnings==False:
@@ -392,10 +1135,11 @@ class EntityBase(Generic[T]):
             conv = ConveyorBelt.first() #first conveyor belt
             sim = SimEnvManager.first() #first (and only) simenv manager
         """
-        all = cls._find_all_internal()
+        EntityBase._log_line_number()
+        all = EntityBase._entity_index.get(cls)
         if len(all) > 0:
             return random.choice(all)
-        all = cls._find_all_internal(True)
+        all = EntityBase._entity_index.get(cls, True)
         if len(all) > 0:
             return random.choice(all)
         if suppress_warnings==False:
@@ -414,27 +1158,34 @@ class EntityBase(Generic[T]):
         if "synccall" not in kwargs or "internal" != kwargs["synccall"]:
             raise KeyError(f"entity '{entity_name}' does not exist in the SimEnv")
 
-        self.last_sync_utc = datetime.utcnow()
+        self.last_sync_ns = time.monotonic_ns()
         EntityBase._entity_dict[fullname] = self
         self.event_handlers:Dict[str, List[Callable[[T,float, NPArray],None]]] = dict()
+        EntityBase._entity_index.add(self)
+        EntityBase._push_expiry(self)
 
     def _post_API_call(self):
         # stuff to do after each api call
         self._log_line_number()
 
-    def _check_get_rate(self, k:str):
+    @staticmethod
+    def _check_get_rate(k:str):
+        session = Session._local.session
+        if session._lockstep:
+            return  # the script paces the SimEnv with step(), no tick would arrive while waiting
         t0,c0 = 0,0
-        if k in EntityBase._in_time_dict:
-            t0,c0 = EntityBase._in_time_dict[k]
+        in_time_dict = session._in_time_dict
+        if k in in_time_dict:
+            t0,c0 = in_time_dict[k]
         t1 = time.time_ns()
         if t1 < t0 + 3*1e6: #3ms
-            EntityBase._in_time_dict[k] = (t1,c0+1)
+            in_time_dict[k] = (t1,c0+1)
             if c0 >= 20:
                 EntityBase._log_debug_static(f"Getter rate limit: use sleep() or SimEnv.run_main() to repeatedly get data such as '{k}'", Colors.Yellow)
                 _dispatch_events()
                 await_receive()
         else:
-            EntityBase._in_time_dict[k] = (t1,0)
+            in_time_dict[k] = (t1,0)
 
     def _build_name(self, prop_name="") -> str:
         # if self.IsValid() == False:
@@ -457,47 +1208,51 @@ class EntityBase(Generic[T]):
 
     def _get_array_raw(self, prop_name:str, shape:List[int] = [0,0,0]) -> np.ndarray:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
             squeeze_axe = []
             shape = list(shape)
             for i in range(len(shape)):
                 if shape[i] == 0:
-                    shape[i] = self._in_dict[k].array_data.shape[i]
+                    shape[i] = nparr.array_data.shape[i]
                 if shape[i] == 1:
                     squeeze_axe.append(i)
-            return self._in_dict[k].array_data[0:shape[0],0:shape[1],0:shape[2]].squeeze(tuple(squeeze_axe))
+            return nparr.array_data[0:shape[0],0:shape[1],0:shape[2]].squeeze(tuple(squeeze_axe))
         if not _is_custom_level_runner():
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return np.zeros(shape, dtype=np.uint8)
 
     def _get_float(self, prop_name: str) -> float:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return float(self._in_dict[k].array_data[0][0][0])
+            return float(nparr.array_data[0][0][0])
         if not _is_custom_level_runner():
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return 0.0
 
     def _get_vector3d(self, prop_name: str) -> Vector3:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return Vector3(self._in_dict[k].array_data.squeeze()[:3])
+            return nparr._memo("vector3d", lambda x: Vector3(x.array_data.squeeze()[:3])).copy()
         if not _is_custom_level_runner():
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return Vector3()
 
     def _get_rotator3d(self, prop_name: str) -> Rotator3:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return Rotator3(self._in_dict[k].array_data.squeeze()[:3])
+            return nparr._memo("rotator3d", lambda x: Rotator3(x.array_data.squeeze()[:3])).copy()
         if not _is_custom_level_runner():
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return Rotator3()
@@ -505,20 +1260,22 @@ class EntityBase(Generic[T]):
 
     def _get_uint8(self, prop_name: str) -> int:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return int(self._in_dict[k].array_data[0][0][0])
+            return int(nparr.array_data[0][0][0])
         if not _is_custom_level_runner():
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return 0
 
     def _get_int(self, prop_name: str) -> int:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return int.from_bytes(self._in_dict[k].array_data.squeeze().tobytes(), "little", signed=True)
+            return int.from_bytes(nparr.array_data.squeeze().tobytes(), "little", signed=True)
         
         if not _is_custom_level_runner():    
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
@@ -526,34 +1283,177 @@ class EntityBase(Generic[T]):
 
     def _get_bool(self, prop_name: str) -> bool:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return int(self._in_dict[k].array_data[0][0][0]) != 0
+            return int(nparr.array_data[0][0][0]) != 0
         if not _is_custom_level_runner():
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return False
 
     def _get_string(self, prop_name: str) -> str:
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return (self._in_dict[k].get_string())  # check if ascii
+            return nparr._memo("string", NPArray.get_string)  # check if ascii
         if not _is_custom_level_runner():    
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return ""
 
-    def _get_json(self, prop_name: str, suppress_warn = False) -> dict[str, Any]:
+    def _get_json(self, prop_name: str, suppress_warn = False, shared = False) -> dict[str, Any]:
+        """decoded json payload of the property. with shared=True the dict is parsed once per received update and shared between callers, so it must not be mutated."""
         k = self._build_name(prop_name)
-        if k in self._in_dict:
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None:
             self._check_get_rate(k)
             self._post_API_call()
-            return self._in_dict[k].get_json_dict()
+            if shared:
+                return nparr._memo("json", NPArray.get_json_dict)
+            return nparr.get_json_dict()
         if not _is_custom_level_runner() and not suppress_warn:
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return {}
 
+    def _get_history(self, prop_name: str, capacity: int) -> SensorHistory:
+        k = self._build_name(prop_name)
+        history = EntityBase._histories.get(k, None)
+        if history is None or history.capacity < capacity:
+            # start recording, seeded with what was recorded so far or the current value
+            new_history = SensorHistory(max(capacity, 64))
+            if history is not None:
+                values, times = history.get(history.capacity)
+                for v, t in zip(values, times):
+                    new_history.record(v, t)
+            elif k in EntityBase._in_dict:
+                new_history.record(EntityBase._in_dict[k].array_data, EntityBase._in_dict[k].sim_time)
+            EntityBase._histories[k] = new_history
+            history = new_history
+        return history
+
+    @classmethod
+    def gather(cls, prop_names: str | Sequence[str], entities: Optional[Sequence["EntityBase"]] = None) -> np.ndarray:
+        """Read the same sensor properties of many entities at once. Returns an (N,k,3) float32 array for N entities and k properties, where scalar properties only fill the first column. Properties that are unavailable stay zero. If no entities are given, all entities of the current type are used, sorted by name.
+
+        Args:
+            prop_names (str | Sequence[str]): Names of the properties to read, for example ["Location", "LinearVelocity"].
+            entities (Optional[Sequence[EntityBase]], optional): The entities to read from. Defaults to None for all entities of this type.
+
+        Example:
+            >>>
+            drones = ServiceDrone.find_all()
+            dat = ServiceDrone.gather(["Location", "LinearVelocity"], drones)
+            locs, vels = dat[:, 0], dat[:, 1]
+            centroid = locs.mean(axis=0)
+        """
+        if isinstance(prop_names, str):
+            prop_names = [prop_names]
+        if entities is None:
+            entities = EntityBase._entity_index.get(cls)
+        EntityBase._check_get_rate(cls.__name__ + ".gather")
+        EntityBase._log_line_number()
+        out = np.zeros((len(entities), len(prop_names), 3), dtype=np.float32)
+        rows = out.reshape(-1, 3)
+        in_dict = EntityBase._in_dict
+        row_ids: List[int] = []
+        arrs: List[np.ndarray] = []
+        for i, entity in enumerate(entities):
+            prefix = entity._build_name() + "."
+            for j, prop_name in enumerate(prop_names):
+                nparr = in_dict.get(prefix + prop_name, None)
+                if nparr is not None:
+                    row_ids.append(i * len(prop_names) + j)
+                    arrs.append(nparr.array_data)
+        num_missing = rows.shape[0] - len(arrs)
+        if len(arrs) > 0 and all(arr.shape == arrs[0].shape for arr in arrs):
+            # one copy if all payloads have the same shape
+            vals = np.stack(arrs).reshape(len(arrs), -1)[:, :3]
+            rows[row_ids, :vals.shape[1]] = vals
+        else:
+            for row_id, arr in zip(row_ids, arrs):
+                vals = arr.reshape(-1)[:3]
+                rows[row_id, :vals.shape[0]] = vals
+        if num_missing > 0 and not _is_custom_level_runner():
+            EntityBase._log_debug_static(f"Sensor unavailable: {num_missing} of {out.shape[0] * out.shape[1]} values in gather({list(prop_names)})", Colors.Yellow)
+        return out
+
+    @classmethod
+    def scatter(cls, prop_name: str, entities: Sequence["EntityBase"], values: Sequence[Any] | np.ndarray, kind: str) -> None:
+        """Send the same command to many entities at once, with one value (or vector) per entity. All commands are queued together and are not rate limited, so a whole fleet can be reconfigured within one tick. A single value (or vector) is sent to all entities.
+
+        Args:
+            prop_name (str): Name of the command, for example "setTargetSpeed".
+            entities (Sequence[EntityBase]): The entities to send the command to.
+            values (Sequence[Any] | np.ndarray): One value per entity, or an (N,3) array for "vector3d", or a single value for all.
+            kind (str): How the regular setter of the property sends its value: "float", "vector3d", "int", "bool" or "uint8".
+
+        Example:
+            >>>
+            belts = ConveyorBelt.find_all()
+            ConveyorBelt.scatter("setTargetSpeed", belts, np.linspace(1, 3, len(belts)), kind="float")
+        """
+        if kind not in EntityBase._SCATTER_KINDS:
+            raise ValueError(f"scatter got unknown kind '{kind}', use one of {list(EntityBase._SCATTER_KINDS)}")
+        if len(entities) == 0:
+            return
+        arity = EntityBase._SCATTER_KINDS[kind]
+        vals = np.asarray(values)
+        if vals.ndim == (0 if arity == 1 else 1):
+            vals = np.broadcast_to(vals, (len(entities),) + vals.shape)
+        # one owned buffer, every command payload is a row view into it
+        vals = vals.reshape(vals.shape[0], -1)
+        if vals.shape != (len(entities), arity):
+            raise ValueError(f"scatter '{prop_name}' needs {arity} value(s) for each of {len(entities)} entities, got shape {np.shape(values)}")
+        if kind == "int":
+            # 4 little endian bytes per value like _set_int
+            rows = vals.astype("<i4").view(np.uint8)
+        elif kind == "uint8":
+            rows = np.clip(vals, 0, 255).astype(np.uint8)
+        elif kind == "bool":
+            rows = (vals != 0).astype(np.uint8)
+        else:
+            rows = vals.astype(np.float32)
+        frames = [NPArray(entity._build_name(prop_name), rows[i]) for i, entity in enumerate(entities)]
+        if EntityBase._dedup_enabled:
+            frames = [nparr for nparr in frames if not EntityBase._is_redundant(nparr.unique_name, nparr)]
+        batch_queue = CommandBatch._active()
+        EntityBase.sendlock.acquire()
+        out_queue = EntityBase._out_queue if batch_queue is None else batch_queue
+        for nparr in frames:
+            nparr.time_id = next(NPArray.time_id_it)
+            out_queue.put(nparr.unique_name, nparr)
+        EntityBase.sendlock.release()
+        if batch_queue is None:
+            EntityBase._wakeup_sender()
+        EntityBase._log_line_number()
+
+    def history(self, prop_name: str, n: int = 32) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the last n values of a sensor property together with the simulation times (in seconds) they were received at, oldest first. Recording starts with the first call for a property, so fewer than n values may be returned at first. Values are flattened, so 3d properties like "Location" give an (n,3) array.
+
+        Example:
+            >>>
+            tracker = SmartTracker.first()
+            locs, times = tracker.history("Location", 10)
+            vel = (locs[-1] - locs[0]) / max(times[-1] - times[0], 1e-3)
+        """
+        self._post_API_call()
+        return self._get_history(prop_name, n).get(n)
+
+    def value_at(self, prop_name: str, sim_time: float) -> Optional[np.ndarray]:
+        """Get the flattened value a sensor property had at the given simulation time (in seconds), as recorded by history(). None if that time is not covered by the recorded history.
+
+        Example:
+            >>>
+            tracker = SmartTracker.first()
+            tracker.history("Location") #start recording
+            sleep(1)
+            loc_before = tracker.value_at("Location", SimEnvManager.first().get_sim_time() - 0.5)
+        """
+        self._post_API_call()
+        return self._get_history(prop_name, 0).value_at(sim_time)
+
     def _set_void(self, prop_name: str, append: bool = False):
         k = self._build_name(prop_name)
         nparr = NPArray(k, np.asarray([], dtype=np.float32))
@@ -632,22 +1532,39 @@ class EntityBase(Generic[T]):
     def _get_image(self, prop_name: str, channels=3) -> np.ndarray:
         k = self._build_name(prop_name)
         self._post_API_call()
-        if (
-            k in self._in_dict
-            and len(self._in_dict[k].array_data.shape) == 3
-            and self._in_dict[k].array_data.shape[2] >= channels
-        ):
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None and len(nparr.array_data.shape) == 3 and nparr.array_data.shape[2] >= channels:
             self._check_get_rate(k)
+            # the received array views the receive buffer, hand out a single copy the script may keep and modify
             if channels == 3:
-                return self._in_dict[k].array_data[:, :, (2, 1, 0)] + 1 - 1  # but why?
+                return nparr.array_data[:, :, (2, 1, 0)]
             if channels == 2:
-                return self._in_dict[k].array_data[:, :, (0, 1)] + 1 - 1  # but why?
-            if channels == 1:
-                return self._in_dict[k].array_data[:, :, 0] + 1 - 1  # but why?
+                return nparr.array_data[:, :, (0, 1)]
+            return nparr.array_data[:, :, 0].copy()
         if not _is_custom_level_runner():    
             EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
         return self._BLANK_IMAGE if channels == 3 else self._BLANK_IMAGE[:, :, 0] if channels <=1 else self._BLANK_IMAGE[:, :, 0:2]
 
+    def _get_image_view(self, prop_name: str, channels=3) -> Tuple[int, np.ndarray]:
+        """like _get_image, but returns the frame id and a read-only view into the FrameRing of the property"""
+        k = self._build_name(prop_name)
+        self._post_API_call()
+        nparr = EntityBase._in_dict.get(k, None)
+        if nparr is not None and len(nparr.array_data.shape) == 3 and nparr.array_data.shape[2] >= channels:
+            self._check_get_rate(k)
+            # views handed out for other channel counts of the same property must stay valid
+            key = (k, channels)
+            ring = EntityBase._frame_rings.get(key, None)
+            if ring is None:
+                ring = EntityBase._frame_rings[key] = FrameRing()
+            return ring.update(nparr, channels)
+        if not _is_custom_level_runner():
+            EntityBase._log_debug_static(f"Sensor unavailable: {k}", Colors.Yellow)
+        blank = self._BLANK_IMAGE if channels == 3 else self._BLANK_IMAGE[:, :, 0] if channels <=1 else self._BLANK_IMAGE[:, :, 0:2]
+        view = blank.view()
+        view.flags.writeable = False
+        return 0, view
+
     # def _is_already_set(self,arr:NPArray)->bool:
     #     return False
     #     if arr.unique_name in EntityBase.inDict and arr.unique_name not in EntityBase.outDict and EntityBase.inDict[arr.unique_name].pack_msg() == arr.pack_msg():
@@ -661,10 +1578,15 @@ class EntityBase(Generic[T]):
     #         return True
     #     return False
 
+    @property
+    def last_sync_utc(self) -> datetime:
+        """utc time this entity was last received from the SimEnv, see last_sync_ns for the time.monotonic_ns() value"""
+        return _utc_from_monotonic(self.last_sync_ns)
+
     @property
     def is_valid(self) -> bool:
         """checks if this entity is still in the SimEnv and valid"""
-        return _debugger_is_active() or (datetime.utcnow() - self.last_sync_utc).total_seconds() < 3
+        return _debugger_is_active() or time.monotonic_ns() - self.last_sync_ns < EntityBase._VALID_NS
 
     @property
     def entity_name(self) -> str:
@@ -715,14 +1637,19 @@ class EntityBase(Generic[T]):
             return -1
         if _is_custom_level_runner():
             return -1
-        cf = currentframe()
-        if not cf:
-            return -1
-        m = inspect.getmodule(cf)
-        while cf.f_back and m and m.__name__.startswith("pyjop."):
+        # walk out of pyjop frames. whether a code object belongs to pyjop is cached per code object
+        is_pyjop = EntityBase._pyjop_code
+        cf = sys._getframe(1)
+        while cf.f_back:
+            code = cf.f_code
+            inside = is_pyjop.get(code)
+            if inside is None:
+                inside = str(cf.f_globals.get("__name__", "")).startswith("pyjop.")
+                is_pyjop[code] = inside
+            if not inside:
+                break
             cf = cf.f_back
-        finfo = getframeinfo(cf)
-        return finfo.lineno
+        return cf.f_lineno
 
     @staticmethod
     def _log_line_number():
@@ -730,6 +1657,13 @@ class EntityBase(Generic[T]):
         no = EntityBase._get_line_number()
         if no < 0:
             return
+        # only send again if the line changed since the last send within the current tick
+        session = Session._local.session
+        tick = session._receive_ticks.tick
+        if no == session._last_line_no and tick == session._last_line_tick:
+            return
+        session._last_line_no = no
+        session._last_line_tick = tick
         # builtins.print(no)
         k = "SimEnvManager.Current.LogLineNo"
         nparr = NPArray(k, np.frombuffer(int.to_bytes(no, 4, "little"), dtype=np.uint8))
@@ -737,24 +1671,13 @@ class EntityBase(Generic[T]):
 
     def log_debug(self, msg: str, col=Colors.White):
         """log a debug message into Python and into the SimEnv from this entity"""
-        k = self._build_name("LogDebug")
-        jsonDict = {"msg": msg, "col": _parse_color(col)}
-        bytes = json.dumps(jsonDict, ensure_ascii=False).encode("utf-8")
-        nparr = NPArray(k, np.frombuffer(bytes, dtype=np.uint8))
-
-        self._set_out_data(k, nparr, True)
-
+        EntityBase._log_pipeline.put(self._build_name("LogDebug"), msg, _parse_color(col))
         self._post_API_call()
 
     @staticmethod
     def _log_debug_static(msg: str, col=Colors.White, log_level = VerbosityLevels.Important):
         """log a debug message into Python and into the SimEnv"""
-        jsonDict = {"msg": msg, "col": _parse_color(col), "level": int(log_level)}
-        k = "SimEnvManager.Current.LogDebug"
-        bytes = json.dumps(jsonDict, ensure_ascii=False).encode("utf-8")
-        nparr = NPArray(k, np.frombuffer(bytes, dtype=np.uint8))
-        EntityBase._set_out_data(k, nparr, True, 30)
-        
+        EntityBase._log_pipeline.put("SimEnvManager.Current.LogDebug", msg, _parse_color(col), int(log_level))
         EntityBase._log_line_number()
 
     @staticmethod
@@ -762,19 +1685,7 @@ class EntityBase(Generic[T]):
         """display an image in the SimEnv log"""
 
         k = "SimEnvManager.Current.LogImg"
-
-        if len(imgArr.shape) == 2:
-            imgArr = np.expand_dims(imgArr, 2)
-
-        if imgArr.shape[0] != 256 or imgArr.shape[1] != 256:
-            imgArr = skimage.transform.resize(imgArr, (256, 256), anti_aliasing = False, preserve_range=True, order=0)
-
-        # convert to uint8
-        if imgArr.dtype != np.uint8:
-            imgArr = (imgArr * 255).astype(np.uint8)
-
-        if imgArr.shape[2] == 3:
-            imgArr = np.dstack((imgArr, np.ones((256, 256), dtype=np.uint8) * 255))
+        imgArr = ImageLogEncoder.encode(imgArr)
 
         nparr = NPArray(k, imgArr)
         EntityBase._set_out_data(k, nparr)
@@ -785,11 +1696,10 @@ class EntityBaseStub(EntityBase[T]):
     pass
 
 def await_send(timeout=6):
-    start = 0.0
-    last_send = EntityBase.last_send_at
-    while last_send == EntityBase.last_send_at and start < timeout:
-        time.sleep(0.002)
-        start += 0.002
+    if _in_event_loop():
+        return  # blocking would stall the loop that delivers the tick
+    last_send = EntityBase._send_ticks.tick
+    EntityBase._send_ticks.wait(last_send, timeout)
 
 def await_receive(timeout=6):
     """Wait for one roundtrip between Python and the SimEnv
@@ -798,11 +1708,54 @@ def await_receive(timeout=6):
         timeout (int, optional): Defaults to 6 seconds.
     """
 
-    start = 0.0
-    last_receive = EntityBase.last_receive_at
-    while last_receive == EntityBase.last_receive_at and start < timeout:
-        time.sleep(0.002)
-        start += 0.002
+    if _in_event_loop():
+        return  # blocking would stall the loop that delivers the tick
+    last_receive = EntityBase._receive_ticks.tick
+    EntityBase._receive_ticks.wait(last_receive, timeout)
+
+
+def _in_event_loop() -> bool:
+    """True if called from within the event loop of the asyncio client (see SimEnv.connect_async)"""
+    loop = EntityBase._event_loop
+    if loop is None:
+        return False
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def _schedule_coroutine(coro):
+    """run a coroutine returned by an event handler as a task on the asyncio client loop, else on the loop running in the calling thread, else to completion"""
+    loop = EntityBase._event_loop
+    if loop is not None and not loop.is_closed():
+        if _in_event_loop():
+            loop.create_task(coro).add_done_callback(_log_task_error)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, loop).add_done_callback(_log_task_error)
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(coro)
+    else:
+        # asyncio.run cannot be nested in a running loop
+        running.create_task(coro).add_done_callback(_log_task_error)
+
+
+def _call_event_handler(handler: Callable, *args):
+    """call one event handler. errors are logged and do not drop the remaining events."""
+    try:
+        res = handler(*args)
+        if asyncio.iscoroutine(res):
+            _schedule_coroutine(res)
+    except Exception as err:
+        EntityBase._log_debug_static("Event error: " + str(err), (1,0,0))
+
+
+def _log_task_error(fut):
+    if not fut.cancelled() and fut.exception() is not None:
+        EntityBase._log_debug_static("Event error: " + str(fut.exception()), (1,0,0))
 
 
 def _find_all_entity_classes(modules: List[ModuleType]) -> List[Type[EntityBase]]:
@@ -843,26 +1796,31 @@ def _find_all_entity_classes_rec(
 
 
 def _dispatch_events():
-    try:
-        gt = float(EntityBase._in_dict["SimEnvManager.Current.SimTime"].array_data[0,0,0])
-        while True:
-            event = EntityBase._event_queue.get_nowait()
-            if not event:
-                return
-            if event[1] is None:
-                continue
-            nparr = event[0]
-            type_name, entity_name, prop_name = nparr.unique_name.split(".")
-            fullname = type_name + "." + entity_name
-            if fullname not in EntityBase._entity_dict:
-                continue
-            
-            event[1](EntityBase._entity_dict[fullname],gt,nparr)
-    except queue.Empty:
-        pass
-    except Exception as err:
-        EntityBase._log_debug_static("Event error: " + str(err), (1,0,0))
-        pass
+    session = Session._local.session
+    sim_time = session._in_dict.get("SimEnvManager.Current.SimTime", None)
+    if sim_time is not None:
+        gt = float(sim_time.array_data[0,0,0])
+        try:
+            while not session._removed_queue.empty():
+                entity = session._removed_queue.get_nowait()
+                for cls, handler in session._removal_handlers:
+                    if isinstance(entity, cls):
+                        _call_event_handler(handler, entity, gt)
+            while True:
+                event = session._event_queue.get_nowait()
+                if not event:
+                    break
+                if event[1] is None:
+                    continue
+                nparr = event[0]
+                type_name, entity_name, prop_name = nparr.unique_name.split(".")
+                fullname = type_name + "." + entity_name
+                entity = session._entity_dict.get(fullname, None)
+                if entity is None:
+                    continue
+                _call_event_handler(event[1], entity, gt, nparr)
+        except queue.Empty:
+            pass
 
     if EntityBase._is_debug_paused and _debugger_is_active():
         from pyjop.Network import SockAPIClient, SimEnv
@@ -1,4 +1,5 @@
 
+import copy
 import json
 from typing import (
     Any,
@@ -18,12 +19,14 @@ from pyjop.EntityBase import (
     EntityBaseStub,
     JoyfulException,
     NPArray,
+    Session,
     _is_custom_level_runner,
     _stack_size,
     await_receive,
     _parse_color,
     _parse_vector,
-    _dispatch_events
+    _dispatch_events,
+    _in_event_loop
 )
 from pyjop.Enums import *
 import numpy as np
@@ -514,7 +517,7 @@ class DeliveryContainer(EntityBase["DeliveryContainer"]):
             except:
                 pass
             if dat is not None:
-                handler(sender,gametime,dat)
+                return handler(sender,gametime,dat)
 
         self._add_event_listener("_eventOnDelivered",wrapper)
 
@@ -704,7 +707,8 @@ class SmartPictureFrame(EntityBase["SmartPictureFrame"]):
     def set_image_by_bytes(self, img_bytes: np.ndarray):
         """sets the image to the specified image array"""
         k = self._build_name("SetImgByBytes")
-        nparr = NPArray(k, img_bytes)
+        # snapshot the caller's array, it is sent later by the io thread without copying
+        nparr = NPArray(k, np.array(img_bytes, copy=True))
         self._set_out_data(k, nparr)
         self._post_API_call()
 
@@ -759,6 +763,7 @@ class SimEnvManager(EntityBase["SimEnvManager"]):
         if await_reset:
             sleep()
         t = self.get_sim_time()
+        EntityBase._last_sent = dict()
         if stop_code:
             self._set_void("ResetSimEnv")
         else:
@@ -766,8 +771,10 @@ class SimEnvManager(EntityBase["SimEnvManager"]):
             if not await_reset:
                 return
             #  wait for next update loop
-            for i in range(200):
-                time.sleep(0.01)
+            deadline = time.monotonic() + 2
+            tick = EntityBase._receive_ticks.tick
+            while not EntityBase._receive_ticks.closed and time.monotonic() < deadline:
+                tick = EntityBase._receive_ticks.wait(tick, deadline - time.monotonic())
                 t2 = self.get_sim_time()
                 if t2 >= 0 and (t2 < 2 or t2 < t):
                     break
@@ -852,6 +859,76 @@ class SimEnvManager(EntityBase["SimEnvManager"]):
             val = 0.00001
         return val
 
+    def set_lockstep(self, enabled: bool = True):
+        """Pause the SimEnv and only advance it with step(), e.g. for reinforcement learning rollouts that must not lose samples when Python is slow. Disabling lockstep resumes the SimEnv at normal speed.
+
+        Args:
+            enabled (bool, optional): True to enter lockstep mode, False to leave it. Defaults to True.
+
+        Example:
+            >>>
+            lvl = SimEnvManager.first()
+            lvl.set_lockstep(True)
+            car = RaceCar.first()
+            for i in range(1000):
+                car.set_throttle(policy(car.get_location())) #action for this tick
+                lvl.step() #advance one tick and receive the observations
+            lvl.set_lockstep(False)
+        """
+        EntityBase._step_remaining = 0
+        EntityBase._lockstep = enabled
+        # tells servers that wait for every tick to be acknowledged (like pyjop.Loopback.LoopbackServer) to stop waiting
+        k = self._build_name("setLockstep")
+        EntityBase._set_out_data(k, NPArray(k, np.asarray([1 if enabled else 0], dtype=np.uint8)), force=True)
+        EntityBase._queue_time_dilation(0.0 if enabled else 1.0)
+        self._post_API_call()
+        _dispatch_events()
+
+    def step(self, ticks: int = 1, dilation: float = 1.0, timeout: float = 5) -> float:
+        """Advance the SimEnv by the given number of ticks while in lockstep mode (see set_lockstep) and wait until the observations of the last tick were received. All commands called before are sent together with the request to advance.
+        Every tick is acknowledged and the SimEnv is paused again as soon as the last tick arrives. The SimEnv may still run a few more ticks until the pause reaches it, so exact reproducibility depends on the server (pyjop.Loopback.LoopbackServer steps exactly).
+
+        Args:
+            ticks (int, optional): Number of ticks to advance. Defaults to 1.
+            dilation (float, optional): Time dilation to run the ticks with. Defaults to 1.0.
+            timeout (float, optional): Seconds to wait for each tick before giving up. Defaults to 5.
+
+        Returns:
+            float: The sim time of the last tick.
+
+        Example:
+            >>>
+            lvl = SimEnvManager.first()
+            lvl.set_lockstep(True)
+            t = lvl.step(4) #advance 4 ticks, returns the sim time afterwards
+        """
+        if not EntityBase._lockstep:
+            raise JoyfulException("SimEnvManager.step() requires lockstep mode, call set_lockstep(True) first.")
+        if _in_event_loop():
+            raise JoyfulException("SimEnvManager.step() would block the event loop.")
+        if ticks <= 0:
+            return _current_sim_time()
+        self._begin_step(ticks, dilation)
+        self._await_step(timeout)
+        return _current_sim_time()
+
+    def _begin_step(self, ticks: int, dilation: float):
+        """request the next ticks without waiting for them, so several sessions can step at once"""
+        EntityBase._step_dilation = dilation
+        EntityBase._step_remaining = ticks
+        EntityBase._queue_time_dilation(dilation)
+        self._post_API_call()
+
+    def _await_step(self, timeout: float):
+        tick = EntityBase._receive_ticks.tick
+        while EntityBase._step_remaining > 0 and not EntityBase._receive_ticks.closed:
+            last = tick
+            tick = EntityBase._receive_ticks.wait(last, timeout)
+            if tick == last and EntityBase._step_remaining > 0:
+                EntityBase._step_remaining = 0
+                raise JoyfulException(f"SimEnvManager.step() timed out after {timeout} seconds without a tick.")
+        _dispatch_events()
+
     def query_input(self, prompt: str):
         """Show a modal input dialog in the SimEnv and allow the user to enter some text value. Asynchronous, does not wait for the user to enter something. Recommended to use "input" command instead for synchronous querying.
 
@@ -886,7 +963,7 @@ class SimEnvManager(EntityBase["SimEnvManager"]):
             else:
                 print("wrong")
         """
-        js = self._get_json("InputResponse")
+        js = self._get_json("InputResponse", shared=True)
         if "res" in js:
             return js["res"]
         return ""
@@ -997,9 +1074,15 @@ def sleep(seconds: float = 0, ignore_time_dilation = False):
         sleep(1.5) #sleeps for 1.5 SimEnv seconds
         sleep() #sleep until next simulation round trip tick
     """
+    if _in_event_loop():
+        raise JoyfulException("sleep() would block the event loop, use 'await sleep_async()' instead.")
+    if not Session.current()._is_connected and not _is_custom_level_runner():
+        # no sim time to wait for
+        if seconds is not None and seconds > 0:
+            time.sleep(seconds)
+        return
     start = time.time()
-    m = SimEnvManager.first()
-    start_sim = m.get_sim_time()
+    start_sim = _current_sim_time()
     await_receive()
     _dispatch_events()
     if seconds is None or seconds <= 0.1:
@@ -1021,23 +1104,42 @@ def sleep(seconds: float = 0, ignore_time_dilation = False):
                 editor._run_dynamics()
         return
 
-    if m.get_time_dilation() > 2:
-        seconds = seconds-0.149 #offset
-    elif m.get_time_dilation() > 0.9:
-        seconds = seconds-0.099 #offset
-            
-   
     if start_sim < 0:
-        start_sim = m.get_sim_time()
-    while True:
-        time.sleep(0.03)
+        start_sim = _current_sim_time()
+    # woken by the receiving thread once the sim time is about to pass the target, or to run event handlers
+    scheduler = EntityBase._sim_scheduler
+    sleeper = scheduler.add(start_sim + seconds)
+    while not scheduler.wait(sleeper):
         _dispatch_events()
-        dtime = m.get_sim_time() - start_sim
+    _dispatch_events()
+
+
+async def sleep_async(seconds: float = 0):
+    """Awaitable version of sleep() for scripts connected with SimEnv.connect_async. Waits for the given number of SimEnv seconds without blocking the event loop, so all other tasks keep running. Automatically scaled with SimEnv time dilation.
+
+    Example:
+        >>>
+        await sleep_async(1.5) #sleeps for 1.5 SimEnv seconds
+        await sleep_async() #sleep until next simulation round trip tick
+    """
+    from pyjop.Network import SimEnv
+
+    start_sim = _current_sim_time()
+    await SimEnv.tick()
+    if seconds is None or seconds <= 0.1:
+        return
+    while await SimEnv.tick():
+        dtime = _current_sim_time() - start_sim
         if dtime < 0:#reset fix
-            start_sim = m.get_sim_time()
+            start_sim = _current_sim_time()
         if dtime >= seconds:
             break
-            
+
+
+def _current_sim_time() -> float:
+    # read directly, getter rate limits do not apply to internal polling
+    nparr = EntityBase._in_dict.get("SimEnvManager.Current.SimTime")
+    return nparr.get_float() if nparr is not None else -1.0
 
 
 import builtins
@@ -1057,7 +1159,7 @@ def print_all_entities():
 
 
 def print(*args, col: Colors = Colors.White, log_level = VerbosityLevels.Important) -> None:
-    """print the supplied message to the in-game log. Duplicate print messages directly after one another are ignored. Can also print images directly in-game. Takes optional color for the print message.
+    """print the supplied message to the in-game log. Duplicate print messages directly after one another are merged into one message with a repeat count. Never blocks, messages beyond the log budget per second are dropped. Can also print images directly in-game. Takes optional color for the print message.
 
 
     Args:
@@ -1091,13 +1193,13 @@ def input(prompt="") -> str:
         print(f"Hello {name}! How are you?")
     """
     m = SimEnvManager.first()
-    old_res = m._get_json("InputResponse")  # res and ts (real time)
+    old_res = m._get_json("InputResponse", shared=True)  # res and ts (real time)
     # m.set_time_dilation(0.05)
     m.query_input(prompt)
     while True:
         time.sleep(0.1)
         _dispatch_events()
-        res = m._get_json("InputResponse")
+        res = m._get_json("InputResponse", shared=True)
         if res and res != old_res:
             # m.set_time_dilation(old_dilation)
             return res["res"]
@@ -1512,6 +1614,22 @@ class SmartCamera(EntityBase["SmartCamera"]):
         """
         return self._get_image("CameraFrame")
 
+    def get_camera_frame_view(self) -> Tuple[int, np.ndarray]:
+        """Return the frame id and the current camera frame like get_camera_frame, but without allocating a new image per call. The frame is a read-only view into a small ring of buffers and stays valid while the next two frames arrive, use get_camera_frame or copy it if you want to keep or modify it. The frame id increases with every new frame received from the SimEnv, so an unchanged id means the frame was not updated yet.
+
+        Example:
+            >>>
+            cam = SmartCamera.first()
+            last_id = 0
+            while SimEnv.run_main():
+                frame_id, img = cam.get_camera_frame_view()
+                if frame_id != last_id:
+                    last_id = frame_id
+                    #only process new frames
+                    print(img.mean(axis=(0,1)))
+        """
+        return self._get_image_view("CameraFrame")
+
 
     def get_object_detections(self):
         """Get a list of all objects (entityName, entityType, 2D bounding box) currently visible in the camera view. Not all cameras have integrated object detection.
@@ -1524,7 +1642,7 @@ class SmartCamera(EntityBase["SmartCamera"]):
                 print(f"{d.entity_type} detected at {d.real_distance}m")
 
         """
-        return [DetectionData(d) for d in self._get_json("ObjectDetections")["items"]]
+        return [DetectionData(d) for d in self._get_json("ObjectDetections", shared=True)["items"]]
 
     def editor_set_camera_type(self, new_type:CameraType):
         """[Level Editor Only] Change the camera's operating type.
@@ -1742,7 +1860,7 @@ class SmartPortal(EntityBase["SmartPortal"]):
             except:
                 pass
             if tele is not None:
-                handler(sender,gametime,tele)
+                return handler(sender,gametime,tele)
         self._add_event_listener("_eventOnTeleport",wrapper)
 
 
@@ -1834,7 +1952,7 @@ class Killzone(EntityBase["Killzone"]):
             except:
                 pass
             if dat is not None:
-                handler(sender,gametime,dat)
+                return handler(sender,gametime,dat)
             
         self._add_event_listener("_eventOnKill",wrapper)
 
@@ -2572,7 +2690,7 @@ class LevelEditor(EntityBase["LevelEditor"]):
             entity_type = nameparts[0]
             entity_name = nameparts[1]
             command_name = nameparts[2]
-            handler(gametime,entity_type,entity_name,command_name,nparr_inner)
+            return handler(gametime,entity_type,entity_name,command_name,nparr_inner)
         self._add_event_listener("_eventOnPlayerCommand", wrapper, True)
 
     # run / inference functions
@@ -2925,7 +3043,7 @@ class LevelEditor(EntityBase["LevelEditor"]):
     
     def get_dataset_file(self, dataset_name:str) -> str:
         """Get the full path to the included dataset."""
-        csvs = self._get_json("DatasetPaths")
+        csvs = self._get_json("DatasetPaths", shared=True)
         if dataset_name in csvs:
             return csvs[dataset_name]
         print(f"Dataset not found: {dataset_name}", col=Colors.Yellow)
@@ -3115,7 +3233,7 @@ class LevelEditor(EntityBase["LevelEditor"]):
     def get_player_code(self) -> str:
         """Get the complete python code the player has currently entered. Useful to provide tutorials, interactive code help or hints.
         """
-        code = self._get_json("PlayerCode")
+        code = self._get_json("PlayerCode", shared=True)
         return code["value"] if "value" in code else ""
 
     def add_player_code_hint(self, hint_text:str, line_number = -1):
@@ -3304,11 +3422,8 @@ class LevelEditor(EntityBase["LevelEditor"]):
         time.sleep(0.55)
         
         while SimEnv._is_connected:
-            start = 0.0
-            last_update = EntityBase.last_receive_at
-            while last_update == EntityBase.last_receive_at and start < 3:
-                time.sleep(0.002)
-                start += 0.002
+            last_update = EntityBase._receive_ticks.tick
+            EntityBase._receive_ticks.wait(last_update, 3)
 
             self._last_tick = self._current_tick
             self._current_tick = m.get_sim_time()
@@ -3417,9 +3532,10 @@ class DataExchange(EntityBase["DataExchange"]):
             dat.set_data("number", 5.6)
             print(dat.get_data("number"))
         """
-        all_dat = self._get_json("Data")
+        all_dat = self._get_json("Data", shared=True)
         if key in all_dat:
-            return all_dat[key]
+            # the decoded dict is shared, hand out copies of nested containers
+            return copy.deepcopy(all_dat[key]) if isinstance(all_dat[key], (dict, list)) else all_dat[key]
         print(f"Key '{key}' not found. Valid keys: {self.get_keys()}", col=Colors.Yellow)
         return ""
 
@@ -3429,7 +3545,7 @@ class DataExchange(EntityBase["DataExchange"]):
         Args:
             key (str): The name of the dataset to load. Can be level specific or one of the CsvDatasets.
         """
-        all_dat = self._get_json("Data")
+        all_dat = self._get_json("Data", shared=True)
         if key in all_dat:
             print(f"{key} is not big data. Get it normally with get_data.", col=Colors.Yellow)
             return BytesIO()
@@ -3464,7 +3580,7 @@ class DataExchange(EntityBase["DataExchange"]):
             dat = DataExchange.first()
             print(dat.get_keys())
         """
-        all_dat = self._get_json("Data")
+        all_dat = self._get_json("Data", shared=True)
         return list(all_dat.keys())
 
     def editor_store_big_data(self, key:str, dat:bytes):
@@ -3517,6 +3633,32 @@ class DataExchange(EntityBase["DataExchange"]):
         else:
             return ""
 
+    async def rpc_async(self, func_name:str, *args, **kwargs) -> Any:
+        """Awaitable version of rpc for scripts connected with SimEnv.connect_async. Waits (up to 3 seconds) for the result without blocking the event loop.
+
+        Args:
+            func_name (str): name of the function to call
+            args: positional arguments to pass to the function
+            kwargs: named parameters to pass to the function
+        """
+        from pyjop.Network import SimEnv
+
+        old_dat = ""
+        new_dat = ""
+        if "rpc_result" in self.get_keys():
+            old_dat = self.get_data("rpc_result")
+            new_dat = old_dat
+        start = time.time()
+        js = RPCInvoke(func_name,args, kwargs)
+        self._set_json("rpc", js.__dict__)
+        while new_dat == old_dat and time.time() < start + 3 and await SimEnv.tick():
+            if "rpc_result" in self.get_keys():
+                new_dat = self.get_data("rpc_result")
+        if new_dat and new_dat["func_name"] == func_name:
+            return new_dat["value"]
+        else:
+            return ""
+
     def on_rpc(self, handler:Callable[["DataExchange", RPCInvoke],None]):
         """React to a remote procedure call.
 
@@ -3532,7 +3674,7 @@ class DataExchange(EntityBase["DataExchange"]):
             except:
                 pass
             if rpcinv is not None:
-                handler(sender,rpcinv)
+                return handler(sender,rpcinv)
 
         self._add_event_listener("_eventOnRPC",wrapper)
 
@@ -3578,7 +3720,8 @@ class LEDStrip(EntityBase["LEDStrip"]):
                 arr[j : (j + 3)] = [x * 255.0 for x in c[0]]
                 arr[j + 3] = clamp(c[1]) * 255  # assign data
         else:
-            arr = colors
+            # snapshot the caller's array, it is sent later by the io thread without copying
+            arr = np.array(colors, copy=True)
         k = self._build_name("setAllLeds")
         self._set_out_data(k, NPArray(k, arr), False)
         self._post_API_call()
@@ -3665,9 +3808,9 @@ class Maze(EntityBase["Maze"]):
     def editor_get_shortest_path(self):
         """[Level Editor only] Get the shortest path from entry to exit. Returns Nx2 ndarray with x,y coordinates."""
         k = self._build_name("ShortestPath")
-        if k in self._in_dict:
+        if k in EntityBase._in_dict:
             self._post_API_call()
-            return self._in_dict[k].array_data[:, :, 0]
+            return EntityBase._in_dict[k].array_data[:, :, 0]
 
     def editor_set_path_visible(self, is_visible: bool):
         """[Level Editor only] Show the shortest path in-game."""
@@ -3694,9 +3837,9 @@ class DialupPhone(EntityBase["DialupPhone"]):
             #todo: reconstruct the number 0124 from the audio data?
         """
         k = self._build_name("LastNumberAudio")
-        if k in self._in_dict:
+        if k in EntityBase._in_dict:
             self._post_API_call()
-            return self._in_dict[k].array_data.squeeze()
+            return EntityBase._in_dict[k].array_data.squeeze()
         return None
 
     def dial_number(self, number: str):
@@ -3750,7 +3893,7 @@ class SmartRadar(EntityBase["SmartRadar"]):
             for dat in readings:
                 print(f"{dat.entity_type} at {dat.distance}m")
         """
-        return [RadarData(d) for d in self._get_json("RadarData")["items"]]
+        return [RadarData(d) for d in self._get_json("RadarData", shared=True)["items"]]
 
     def editor_set_radar_range(self, new_range:float):
         """[Level Editor only] Set the radar's max range to the specified value (in meters). """
@@ -3821,7 +3964,7 @@ class ProximitySensor(EntityBase["ProximitySensor"]):
             for dat in readings:
                 print(f"{dat.entity_type} at {dat.distance}m")
         """
-        return [ProximityData(d) for d in self._get_json("ProximityData")["items"]] 
+        return [ProximityData(d) for d in self._get_json("ProximityData", shared=True)["items"]] 
 
     def editor_set_max_range(self, new_range:float):
         """[Level Editor only] Set the proximity sensor's max range to the specified value (in meters). """
@@ -3873,7 +4016,7 @@ class MotionDetector(EntityBase["MotionDetector"]):
             except:
                 pass
             if coll is not None:
-                handler(sender,gametime,coll)
+                return handler(sender,gametime,coll)
 
         self._add_event_listener("_eventOnMovement", wrapper)
 
@@ -3899,7 +4042,7 @@ class SurveillanceSatellite(EntityBase["SurveillanceSatellite"]):
             for dat in readings:
                 print(f"{dat.entity_type} at {dat.world_location}")
         """
-        return [SatelliteData(d) for d in self._get_json("SatelliteData")["items"]]
+        return [SatelliteData(d) for d in self._get_json("SatelliteData", shared=True)["items"]]
 
 
 class Thermometer(EntityBase["Thermometer"]):
@@ -4133,6 +4276,17 @@ class ArcadeMachine(EntityBase["ArcadeMachine"]):
         """
         return self._get_image("CurrentFrame")
 
+    def get_current_frame_view(self) -> Tuple[int, np.ndarray]:
+        """Get the frame id and the current frame image like get_current_frame, but without allocating a new image per call. The image is a read-only view into a small ring of buffers and stays valid while the next two frames arrive, copy it if you want to keep or modify it. The frame id increases with every new frame, an unchanged id means the same frame as before.
+
+        Example:
+            >>>
+            arcade = ArcadeMachine.first()
+            frame_id, img = arcade.get_current_frame_view()
+            print(frame_id, img.shape)
+        """
+        return self._get_image_view("CurrentFrame")
+
     def get_prev_frame(self) -> np.ndarray:
         """Get the prev frame image as it was displayed on the arcade machine. Not all arcade machines support this. Check in the simulation.
 
@@ -4234,7 +4388,7 @@ class PushButton(EntityBase["PushButton"]):
                 sleep(0.1)
         """
         def wrapper(sender:PushButton, gametime:float, nparr:NPArray):
-            handler(sender,gametime)
+            return handler(sender,gametime)
 
         self._add_event_listener("_eventOnPress",wrapper)
 
@@ -4303,7 +4457,7 @@ class ToggleSwitch(EntityBase["ToggleSwitch"]):
         def wrapper(sender:ToggleSwitch, gametime:float, nparr:NPArray):
             if nparr.array_data.size > 0:
                 is_on = bool(nparr.array_data[0][0][0] > 0)
-                handler(sender,gametime,is_on)
+                return handler(sender,gametime,is_on)
 
         self._add_event_listener("_eventOnToggle",wrapper)
 
@@ -4348,7 +4502,7 @@ class Slider(EntityBase["Slider"]):
         def wrapper(sender:Slider, gametime:float, nparr:NPArray):
             if nparr.array_data.size > 0:
                 new_val = float(nparr.array_data[0][0][0])
-                handler(sender,gametime,new_val)
+                return handler(sender,gametime,new_val)
                 
 
         self._add_event_listener("_eventOnChanged",wrapper)
@@ -4404,7 +4558,7 @@ class InputBox(EntityBase["InputBox"]):
         def wrapper(sender:InputBox, gametime:float, nparr:NPArray):
             if nparr.array_data.size > 0:
                 new_text = nparr.array_data.squeeze().tobytes().decode("ascii",errors='replace').strip()
-                handler(sender,gametime,new_text)
+                return handler(sender,gametime,new_text)
                 
 
         self._add_event_listener("_eventOnChanged",wrapper)
@@ -4556,7 +4710,7 @@ class TriggerZone(EntityBase["TriggerZone"]):
             for overlap in trigg.get_overlaps():
                 print(f"triggered at {overlap.at_time}")
         """
-        return [TriggerEvent(d) for d in self._get_json("Overlaps")["items"]]
+        return [TriggerEvent(d) for d in self._get_json("Overlaps", shared=True)["items"]]
 
     def on_triggered(self, handler:Callable[["TriggerZone",float, TriggerEvent],None]):
         """Event called when something enters / overlaps or exits this zone. 
@@ -4589,7 +4743,7 @@ class TriggerZone(EntityBase["TriggerZone"]):
             except:
                 pass
             if coll is not None:
-                handler(sender,gametime,coll)
+                return handler(sender,gametime,coll)
 
         self._add_event_listener("_eventOnTriggered",wrapper)
 
@@ -4622,7 +4776,7 @@ class SmartWall(EntityBase["SmartWall"]):
             for coll in wall.get_collisions():
                 print(f"collision at {coll.at_time} with {coll.entity_type}")
         """
-        dat = self._get_json("Collisions")["items"]
+        dat = self._get_json("Collisions", shared=True)["items"]
         return [CollisionEvent(d) for d in dat]
 
     def on_collision(self, handler:Callable[["SmartWall",float, CollisionEvent],None]):
@@ -4655,7 +4809,7 @@ class SmartWall(EntityBase["SmartWall"]):
             except:
                 pass
             if coll is not None:
-                handler(sender,gametime,coll)
+                return handler(sender,gametime,coll)
 
         self._add_event_listener("_eventOnCollision",wrapper)
 
@@ -5024,7 +5178,7 @@ class SniperRifle(EntityBase["SniperRifle"]):
             for d in dects:
                 print(f"{d.entity_type} detected at {d.real_distance}m")
         """
-        return [DetectionData(d) for d in self._get_json("ObjectDetections")["items"]]
+        return [DetectionData(d) for d in self._get_json("ObjectDetections", shared=True)["items"]]
 
     def on_bullet_hit(self, handler:Callable[["SniperRifle",float, CollisionEvent],None]):
         """Event called when this sniper rifle hits something.
@@ -5051,7 +5205,7 @@ class SniperRifle(EntityBase["SniperRifle"]):
             except:
                 pass
             if coll is not None:
-                handler(sender,gametime,coll)
+                return handler(sender,gametime,coll)
 
         self._add_event_listener("_eventOnBulletHit",wrapper)
 
@@ -5227,7 +5381,7 @@ class Dice(EntityBase["Dice"]):
             except:
                 pass
             if val >= 0:
-                handler(sender,gametime,val)
+                return handler(sender,gametime,val)
         self._add_event_listener("_eventOnLanded", wrapper)
 
     # def dice_roller(roll_string:str):
@@ -5249,7 +5403,7 @@ class DiceRoller(EntityBase["DiceRoller"]):
         def wrapper(sender:DiceRoller, gametime:float, nparr:NPArray):
             vals = [int(val) for val in nparr.array_data.flatten()]
             if vals:
-                handler(sender,gametime,vals)
+                return handler(sender,gametime,vals)
         self._add_event_listener("_eventOnCompleted", wrapper)
 
 class MiniatureFigure(EntityBase["MiniatureFigure"]):
@@ -5296,7 +5450,7 @@ class MiniatureFigure(EntityBase["MiniatureFigure"]):
     def get_state_variables(self) -> List[str]:
         """Retrieve list of available state variables
         """
-        all_dat = self._get_json("Data")
+        all_dat = self._get_json("Data", shared=True)
         return [k for k in list(all_dat.keys()) if not k.startswith("_")]
 
     def get_action_names(self) -> List[str]:
@@ -5500,7 +5654,7 @@ class AlarmClock(EntityBase["AlarmClock"]):
             AlarmClock.first().on_alarm(on_alarm)
         """
         def wrapper(sender:AlarmClock, gametime:float, nparr:NPArray):
-            handler(sender, gametime)
+            return handler(sender, gametime)
 
         self._add_event_listener("_eventOnAlarm", wrapper)
 
@@ -0,0 +1,229 @@
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+import gymnasium
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import AutoresetMode
+from gymnasium.vector.utils import batch_space
+
+from pyjop.EntityBase import EntityBase, JoyfulException, Session
+from pyjop.EntityClasses import ArcadeMachine, HumanoidRobot, RaceCar, SimEnvManager
+from pyjop.Enums import ArcadeButtons
+from pyjop.Network import SimEnv
+
+
+class EntityTask:
+    """Describes how a SimEnvVectorEnv observes, controls and rewards one entity per SimEnv instance. Use the presets race_car(), humanoid_robot() and arcade_machine() or pass your own functions.
+
+    Args:
+        entity_type (Type[EntityBase]): Type of the controlled entity, the first entity of this type in each SimEnv is used.
+        action_space (gymnasium.Space): Action space of a single entity.
+        act (Callable[[EntityBase, Any], None]): Applies an action to the entity.
+        observe (Callable[[EntityBase], np.ndarray]): Returns the observation of the entity.
+        observation_space (gymnasium.Space, optional): Observation space of a single entity. Defaults to a Box matching the first observation.
+        reward (Callable[[EntityBase], float], optional): Returns the reward after a step. Defaults to 0.
+        cumulative_reward (bool, optional): True if reward returns a running total (like a score), the difference to the last step is used then. Defaults to False.
+        done (Callable[[EntityBase], bool], optional): Returns True once the episode is over. Defaults to never.
+        reset (Callable[[EntityBase, SimEnvManager], None], optional): Starts a new episode. Defaults to resetting the SimEnv.
+
+    Example:
+        >>>
+        task = EntityTask(RaceCar, spaces.Box(-1, 1, (1,)), act=lambda car, a: car.set_steering(float(a[0])),
+                          observe=lambda car: np.asarray([car.get_speed()], dtype=np.float32), reward=lambda car: car.get_speed())
+    """
+
+    def __init__(self, entity_type: Type[EntityBase], action_space: gymnasium.Space, act: Callable[[Any, Any], None], observe: Callable[[Any], np.ndarray],
+                 observation_space: Optional[gymnasium.Space] = None, reward: Optional[Callable[[Any], float]] = None, cumulative_reward=False,
+                 done: Optional[Callable[[Any], bool]] = None, reset: Optional[Callable[[Any, SimEnvManager], None]] = None) -> None:
+        self.entity_type = entity_type
+        self.action_space = action_space
+        self.observation_space = observation_space
+        self.act = act
+        self.observe = observe
+        self.reward = reward if reward is not None else lambda entity: 0.0
+        self.cumulative_reward = cumulative_reward
+        self.done = done if done is not None else lambda entity: False
+        self.reset = reset if reset is not None else lambda entity, manager: manager.reset(await_reset=False)
+
+    @staticmethod
+    def race_car(reward: Optional[Callable[[RaceCar], float]] = None) -> "EntityTask":
+        """Steering, throttle and brake in [-1,1], [0,1] and [0,1]. Observes speed, rpm, gear and fuel. Rewards the speed unless another reward is given, the episode ends once the fuel is used up."""
+        def act(car: RaceCar, action):
+            car.set_steering(float(action[0]))
+            car.set_throttle(float(action[1]))
+            car.set_brake(float(action[2]))
+        return EntityTask(
+            RaceCar,
+            spaces.Box(np.asarray([-1, 0, 0], dtype=np.float32), np.asarray([1, 1, 1], dtype=np.float32)),
+            act,
+            lambda car: np.asarray([car.get_speed(), car.get_rpm(), car.get_gear(), car.get_fuel()], dtype=np.float32),
+            spaces.Box(-np.inf, np.inf, (4,), dtype=np.float32),
+            reward if reward is not None else lambda car: car.get_speed(),
+            done=lambda car: car.get_fuel() <= 0,
+        )
+
+    @staticmethod
+    def humanoid_robot(reward: Optional[Callable[[HumanoidRobot], float]] = None) -> "EntityTask":
+        """Walking direction in degrees and speed in [0,1]. Observes orientation, on ground, blocked, carrying and health. The reward is level specific and 0 unless given, the episode ends once the health is used up."""
+        return EntityTask(
+            HumanoidRobot,
+            spaces.Box(np.asarray([-180, 0], dtype=np.float32), np.asarray([180, 1], dtype=np.float32)),
+            lambda robot, action: robot.set_walking(float(action[0]), float(action[1])),
+            lambda robot: np.asarray([robot.get_orientation(), robot.get_is_on_ground(), robot.get_is_blocked(), robot.get_is_carrying(), robot.get_health()], dtype=np.float32),
+            spaces.Box(-np.inf, np.inf, (5,), dtype=np.float32),
+            reward,
+            done=lambda robot: robot.get_health() <= 0,
+        )
+
+    @staticmethod
+    def arcade_machine() -> "EntityTask":
+        """Pushes one of the arcade buttons per step (action 0 pushes none). Observes the current frame, rewards the increase of the score and restarts the game once it is done."""
+        buttons = list(ArcadeButtons)
+        def act(arcade: ArcadeMachine, action):
+            if int(action) > 0:
+                arcade.send_buttons({buttons[int(action) - 1]})
+        return EntityTask(
+            ArcadeMachine,
+            spaces.Discrete(len(buttons) + 1),
+            act,
+            lambda arcade: arcade.get_current_frame_view()[1],  # stacked right away, no copy needed
+            reward=lambda arcade: arcade.get_score(),
+            cumulative_reward=True,
+            done=lambda arcade: arcade.get_done(),
+            reset=lambda arcade, manager: arcade.restart(),
+        )
+
+
+class SimEnvVectorEnv(gymnasium.vector.VectorEnv):
+    """Gymnasium vector environment stepping one entity in each of several SimEnv instances at once, e.g. several games started on different ports. Every instance is connected in its own Session and runs in lockstep (see SimEnvManager.set_lockstep), so all instances advance together and no samples are lost. Observations, rewards and done flags are returned as batched numpy arrays. Finished episodes are reset on the next step.
+
+    Args:
+        task (EntityTask): What to observe, control and reward, e.g. EntityTask.race_car().
+        ports (Sequence[int]): One port per SimEnv instance.
+        host (str, optional): Host pc running the SimEnv instances. Defaults to "127.0.0.1".
+        ticks_per_step (int, optional): SimEnv ticks per step. Defaults to 1.
+        dilation (float, optional): Time dilation the ticks are run with. Defaults to 1.0.
+        timeout (float, optional): Seconds to wait for a tick. Defaults to 5.
+
+    Example:
+        >>>
+        from pyjop.Gym import EntityTask, SimEnvVectorEnv
+        envs = SimEnvVectorEnv(EntityTask.race_car(), ports=[18189, 18190, 18191, 18192])
+        obs, infos = envs.reset()
+        for i in range(1000):
+            obs, rewards, terminated, truncated, infos = envs.step(envs.action_space.sample())
+        envs.close()
+    """
+
+    metadata = {"autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(self, task: EntityTask, ports: Sequence[int], host="127.0.0.1", ticks_per_step=1, dilation=1.0, timeout: float = 5) -> None:
+        self.task = task
+        self.num_envs = len(ports)
+        self.ticks_per_step = ticks_per_step
+        self.dilation = dilation
+        self.timeout = timeout
+        self.sessions = [Session() for _ in ports]
+        self._managers: List[SimEnvManager] = []
+        self._entities: List[EntityBase] = []
+        self._connect(host, ports)
+        self._needs_reset = np.zeros(self.num_envs, dtype=np.bool_)
+        self._last_rewards = np.zeros(self.num_envs, dtype=np.float64)
+
+        self.single_action_space = task.action_space
+        self.action_space = batch_space(task.action_space, self.num_envs)
+        if task.observation_space is None:
+            with self.sessions[0]:
+                first = np.asarray(task.observe(self._entities[0]))
+            task.observation_space = spaces.Box(0, 255, first.shape, first.dtype) if first.dtype == np.uint8 else spaces.Box(-np.inf, np.inf, first.shape, first.dtype)
+        self.single_observation_space = task.observation_space
+        self.observation_space = batch_space(task.observation_space, self.num_envs)
+
+    def _connect(self, host: str, ports: Sequence[int]):
+        """connect all sessions at once, connecting takes about a second each"""
+        connected = [False] * self.num_envs
+        def connect(i: int):
+            with self.sessions[i]:
+                connected[i] = SimEnv.connect(host, ports[i])
+        threads = [threading.Thread(target=connect, args=(i,)) for i in range(self.num_envs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i, session in enumerate(self.sessions):
+            if not connected[i]:
+                raise JoyfulException(f"Cannot connect to the SimEnv at {host}:{ports[i]}")
+            with session:
+                manager = SimEnvManager.first()
+                entity = self.task.entity_type.first()
+                if manager is None or entity is None:
+                    raise JoyfulException(f"The SimEnv at {host}:{ports[i]} has no {self.task.entity_type.__name__}")
+                manager.set_lockstep(True)
+            self._managers.append(manager)
+            self._entities.append(entity)
+
+    def _step_all(self, apply: Callable[[int], None]):
+        """apply the actions (or resets) of all instances, then advance them together"""
+        for i, session in enumerate(self.sessions):
+            with session:
+                apply(i)
+                self._managers[i]._begin_step(self.ticks_per_step, self.dilation)
+        for i, session in enumerate(self.sessions):
+            with session:
+                self._managers[i]._await_step(self.timeout)
+
+    def _observe(self, i: int) -> Tuple[np.ndarray, float, bool]:
+        task, entity = self.task, self._entities[i]
+        with self.sessions[i]:
+            obs = np.asarray(task.observe(entity))
+            reward = float(task.reward(entity))
+            done = bool(task.done(entity))
+        if task.cumulative_reward:
+            reward, self._last_rewards[i] = reward - self._last_rewards[i], reward
+        return obs, reward, done
+
+    def _reset_env(self, i: int):
+        self.task.reset(self._entities[i], self._managers[i])
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        if seed is not None:
+            self.action_space.seed(seed)
+        self._step_all(self._reset_env)
+        self._needs_reset[:] = False
+        self._last_rewards[:] = 0
+        return np.stack([self._observe(i)[0] for i in range(self.num_envs)]), {}
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        resetting = self._needs_reset.copy()
+        def apply(i: int):
+            if resetting[i]:
+                self._reset_env(i)
+            else:
+                self.task.act(self._entities[i], actions[i])
+        self._step_all(apply)
+        observations = []
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        terminated = np.zeros(self.num_envs, dtype=np.bool_)
+        for i in range(self.num_envs):
+            if resetting[i]:
+                self._last_rewards[i] = 0
+            obs, reward, done = self._observe(i)
+            observations.append(obs)
+            if not resetting[i]:
+                rewards[i] = reward
+                terminated[i] = done
+        self._needs_reset = terminated.copy()
+        return np.stack(observations), rewards, terminated, np.zeros(self.num_envs, dtype=np.bool_), {}
+
+    def close_extras(self, **kwargs):
+        for i, session in enumerate(self.sessions):
+            with session:
+                if SimEnv._is_connected:
+                    self._managers[i].set_lockstep(False)
+                    EntityBase._send_ticks.wait(EntityBase._send_ticks.tick, 1)
+                    # the io thread sees the closed connection, exits and closes the tick notifiers
+                    SimEnv._client_socket.shutdown(socket.SHUT_RDWR)
+                    EntityBase._receive_ticks.wait(EntityBase._receive_ticks.tick, 1)
+            session.close()
@@ -0,0 +1,142 @@
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from pyjop.EntityBase import NPArray
+from pyjop.Network import FrameDecoder
+
+
+class LoopbackServer:
+    """Stand-in for the SimEnv that runs a Python step function instead of the game, to test scripts and record rollouts without the game. Speaks the same protocol as the SimEnv on a local port, so scripts connect with SimEnv.connect(port=server.port).
+
+    Every tick the step function gets the sim time and the last value of every command received since the previous tick (keyed by unique name like "RaceCar.car.setThrottle") and returns the sensor values to replicate (keyed like "RaceCar.car.Speed").
+    setTimeDilation and ResetSimEnv commands are handled like in the SimEnv, a time dilation of 0 pauses it. Reset commands are passed on to the step function as well, so it can reset its own state.
+
+    With lockstep=True the stand-in starts paused and each tick waits for the script to acknowledge the previous one, as SimEnvManager.step() does, so lockstep rollouts are exactly reproducible. It runs freely again once the script calls SimEnvManager.set_lockstep(False). Without lockstep it runs one tick every dt seconds like the SimEnv.
+
+    Example:
+        >>>
+        from pyjop import *
+        from pyjop.Loopback import LoopbackServer
+
+        def step(sim_time, commands):
+            throttle = commands.get("RaceCar.car.setThrottle", [0.0])[0]
+            return {"RaceCar.car.Speed": [throttle * 10]}
+
+        with LoopbackServer(step, lockstep=True) as server:
+            SimEnv.connect(port=server.port)
+            lvl = SimEnvManager.first()
+            lvl.set_lockstep(True)
+            car = RaceCar.first()
+            car.set_throttle(0.5)
+            lvl.step()
+            print(car.get_speed()) #5.0
+    """
+
+    def __init__(self, step: Callable[[float, Dict[str, np.ndarray]], Dict[str, np.ndarray]], dt: float = 1 / 60, lockstep=False, port=0, host="127.0.0.1", reply_timeout: float = 5.0) -> None:
+        self.step = step
+        self.dt = dt
+        self.lockstep = lockstep
+        self.reply_timeout = reply_timeout
+        self.sim_time = 0.0
+        self.ticks = 0
+        self.dilation = 0.0 if lockstep else 1.0
+        self._commands: Dict[str, np.ndarray] = dict()
+        self._observations: Dict[str, np.ndarray] = dict()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._listener = socket.socket()
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen(1)
+        self.port: int = self._listener.getsockname()[1]
+        """port to connect to, chosen by the OS if port=0"""
+
+    def start(self) -> "LoopbackServer":
+        """serve one connection in a background thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._listener.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2)
+
+    def __enter__(self) -> "LoopbackServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        try:
+            conn, _ = self._listener.accept()
+        except OSError:
+            return
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        decoder = FrameDecoder()
+        self._observations = self.step(self.sim_time, dict())
+        try:
+            while self._running:
+                advanced = self.dilation > 0
+                if advanced:
+                    self.sim_time += self.dt * self.dilation
+                    self.ticks += 1
+                    commands, self._commands = self._commands, dict()
+                    self._observations = self.step(self.sim_time, commands)
+                conn.sendall(b"".join(arr.pack_msg() for arr in self._frames()))
+                if self.lockstep:
+                    self._receive(conn, decoder, self.reply_timeout if advanced else self.dt, until_ack=True)
+                else:
+                    self._receive(conn, decoder, self.dt)
+        except OSError:
+            pass
+        finally:
+            self._running = False
+            conn.close()
+
+    def _frames(self):
+        yield NPArray("SimEnvManager.Current.SimTime", np.asarray([self.sim_time], dtype=np.float32))
+        yield NPArray("SimEnvManager.Current.TimeDilation", np.asarray([self.dilation], dtype=np.float32))
+        for k, v in self._observations.items():
+            v = np.asarray(v)
+            yield NPArray(k, v.astype(np.float32) if v.dtype == np.float64 else v)
+
+    def _receive(self, conn: socket.socket, decoder: FrameDecoder, timeout: float, until_ack=False):
+        """apply the commands received within timeout seconds. with until_ack it returns as soon as a setTimeDilation arrived."""
+        deadline = time.monotonic() + timeout
+        while self._running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            conn.settimeout(remaining)
+            try:
+                n = conn.recv_into(decoder.buffer())
+            except socket.timeout:
+                return
+            if n == 0:
+                self._running = False
+                return
+            acked = False
+            for arr in decoder.feed_buffer(n):
+                prop = arr.unique_name[arr.unique_name.rfind(".") + 1:]
+                if prop == "setTimeDilation":
+                    self.dilation = max(0.0, arr.get_float())
+                    acked = True
+                elif prop == "setLockstep":
+                    # the script left (or entered) lockstep, so ticks are no longer (or now) acknowledged
+                    self.lockstep = bool(arr.array_data[0])
+                    acked = True
+                else:
+                    if prop in ("ResetSimEnv", "ResetSimEnvNoStop"):
+                        self.sim_time = 0.0
+                        self.ticks = 0
+                    self._commands[arr.unique_name] = np.array(arr.array_data)
+            if until_ack and acked:
+                return
@@ -1,163 +1,370 @@
+import asyncio
 import time
 import numpy as np
 import threading
 import socket
 import errno
+import selectors
 import sys
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, Final, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 
 from psutil import Process
 from os import getpid
 from gc import collect
-from datetime import datetime
 from pyjop.EntityBase import (
+    CommandBatch,
     EntityBase,
     NPArray,
     _find_all_entity_classes_rec,
+    JoyfulException,
+    Session,
+    _session_scoped,
     _is_custom_level_runner,
     _dispatch_events,
-    _debugger_is_active
+    _debugger_is_active,
+    _in_event_loop,
+    await_receive
 )
-import copy
 import inspect
 import random
 import math
 
 
-class SockAPIClient:
+class FrameDecoder:
+    """Incremental decoder for the stream of NPArray frames. Reads every header exactly once and uses its length prefix to jump to the next frame. Large payloads are returned as NPArrays viewing the received chunks without copying, small payloads are copied out so they do not keep a whole chunk alive. Only frames spanning several chunks are assembled in a buffer of their own.
+    Receive with recv_into(buffer()) and feed_buffer(n) to reuse one receive buffer for as long as no decoded frame views it."""
+
+    _FRAME_HEADER_SIZE: Final = len(NPArray._MAGIC_BYTES) + NPArray._HEADER_SIZE
+    COPY_THRESHOLD: Final = 4096  # payloads up to this many bytes are copied out of the chunk
+
+    def __init__(self, buf_size: int = 2**16) -> None:
+        self._head = bytearray()  # incomplete header carried over from the last chunk
+        self._frame: Optional[bytearray] = None  # incomplete frame with known size
+        self._filled = 0
+        self._buf = bytearray(buf_size)
+        self._pinned = False  # a decoded frame views the chunk being fed
+        self.skipped_bytes = 0
+
+    def buffer(self) -> bytearray:
+        """receive buffer for recv_into, pass the number of received bytes to feed_buffer"""
+        return self._buf
+
+    def feed_buffer(self, nbytes: int) -> List[NPArray]:
+        """decode the first nbytes of the receive buffer. the buffer is replaced by a new one if a returned array views it."""
+        frames = self._feed(self._buf, nbytes)
+        if self._pinned:
+            self._buf = bytearray(len(self._buf))
+        return frames
+
+    def feed(self, chunk: bytearray) -> List[NPArray]:
+        """decode all frames completed by the given chunk. the chunk must not be modified afterwards as the returned arrays may still view it."""
+        return self._feed(chunk, len(chunk))
+
+    def _feed(self, chunk: bytearray, end: int) -> List[NPArray]:
+        frames: List[NPArray] = []
+        view = memoryview(chunk)
+        hs = FrameDecoder._FRAME_HEADER_SIZE
+        pos = 0
+        self._pinned = False
+        while pos < end:
+            if self._frame is not None:
+                # continue frame started in a previous chunk
+                n = min(len(self._frame) - self._filled, end - pos)
+                self._frame[self._filled : self._filled + n] = view[pos : pos + n]
+                self._filled += n
+                pos += n
+                self._complete_frame(frames)
+            elif len(self._head) > 0 or end - pos < hs:
+                # complete header split over chunks
+                n = min(hs - len(self._head), end - pos)
+                self._head += view[pos : pos + n]
+                pos += n
+                if len(self._head) < hs:
+                    break
+                head = self._head
+                self._head = bytearray()
+                if head[:4] != NPArray._MAGIC_BYTES:
+                    self._head = self._resync(head, 1, len(head))
+                    continue
+                self._frame = bytearray(hs + int.from_bytes(head[4:8], "little"))
+                self._frame[:hs] = head
+                self._filled = hs
+                # frames without payload are complete with their header
+                self._complete_frame(frames)
+            elif view[pos : pos + 4] != NPArray._MAGIC_BYTES:
+                idx = chunk.find(NPArray._MAGIC_BYTES, pos + 1, end)
+                if idx < 0:
+                    self._head = self._resync(chunk, pos + 1, end)
+                    break
+                self.skipped_bytes += idx - pos
+                pos = idx
+            else:
+                header = NPArray._HEADER_STRUCT.unpack_from(view, pos + 4)
+                size = hs + header[0]
+                if end - pos >= size:
+                    if header[0] > FrameDecoder.COPY_THRESHOLD:
+                        frames.append(NPArray._from_header(header, view, pos + hs))
+                        self._pinned = True
+                    else:
+                        frames.append(NPArray._from_header(header, bytes(view[pos + hs : pos + size]), 0))
+                    pos += size
+                else:
+                    # frame continues in the next chunk(s)
+                    self._frame = bytearray(size)
+                    self._frame[: end - pos] = view[pos:end]
+                    self._filled = end - pos
+                    pos = end
+        return frames
+
+    def _complete_frame(self, frames: List[NPArray]):
+        """emit the assembled frame once it is filled"""
+        if self._frame is not None and self._filled == len(self._frame):
+            header = NPArray._HEADER_STRUCT.unpack_from(self._frame, 4)
+            frames.append(NPArray._from_header(header, self._frame, FrameDecoder._FRAME_HEADER_SIZE))
+            self._frame = None
+
+    def _resync(self, data: bytearray, start: int, end: int) -> bytearray:
+        """skip invalid bytes from start-1 up to the next magic bytes before end. returns the bytes to keep as start of the next header."""
+        idx = data.find(NPArray._MAGIC_BYTES, start, end)
+        if idx < 0:
+            # keep a possibly split magic sequence at the very end
+            idx = max(start, end - len(NPArray._MAGIC_BYTES) + 1)
+        self.skipped_bytes += idx - start + 1
+        return bytearray(data[idx:end])
+
+
+class SendBuffer:
+    """Outgoing frame buffers written with vectored writes (socket.sendmsg where the platform has it). Partially sent buffers are advanced with memoryview offsets, payloads are never joined or sliced into new bytes."""
+
+    _MAX_IOV: Final = 512
+    _HAS_SENDMSG: Final = hasattr(socket.socket, "sendmsg")
+
+    def __init__(self) -> None:
+        self._bufs: Deque[memoryview] = deque()
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._bufs)
+
+    def extend(self, bufs: Iterable[Any]):
+        for b in bufs:
+            b = memoryview(b)
+            if len(b) > 0:
+                self._bufs.append(b)
+                self.nbytes += len(b)
+
+    def write(self, connection: socket.socket) -> int:
+        """send as much as possible without blocking. returns the number of bytes sent, raises on socket errors other than EAGAIN / EWOULDBLOCK."""
+        total = 0
+        while self._bufs:
+            try:
+                if SendBuffer._HAS_SENDMSG:
+                    n = connection.sendmsg(list(islice(self._bufs, SendBuffer._MAX_IOV)))
+                else:
+                    n = connection.send(self._bufs[0])
+            except BlockingIOError:
+                break
+            total += n
+            self._advance(n)
+        return total
+
+    def _advance(self, n: int):
+        self.nbytes -= n
+        while n > 0:
+            b = self._bufs[0]
+            if n >= len(b):
+                n -= len(b)
+                self._bufs.popleft()
+            else:
+                self._bufs[0] = b[n:]
+                n = 0
+
+
+class SockAPIClient(metaclass=_session_scoped("_pending", "_wakeup_r", "_wakeup_w", "_wakeup_pending", "_last_sim_time")):
     BUF_SIZE = 2**16
 
     TIMEOUT = 5
+    MEM_USAGE_INTERVAL = 0.5
+    LOG_FLUSH_INTERVAL = 0.1
     lock = threading.Lock()
+    # the send buffer, wakeup sockets and last sim time are attributes of the current Session
 
     @staticmethod
-    def threaded_receive(connection: socket.socket):
-        # connection.send(str.encode('Welcome to the Servern'))
-        #time.sleep(0.20095217)
-        datall = bytearray()
-        lendatall = 0
-        last_sim_time = -10.0
-        while True:
-            update_receive = False
-            SockAPIClient.lock.acquire()
-            try:
-                while True:
-                    datall += connection.recv(SockAPIClient.BUF_SIZE)
-                    if len(datall) == lendatall:
-                        break
-                    lendatall = len(datall)
-            except socket.error as e:
-                if not (e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK):
-                    SockAPIClient.lock.release()
-                    break
-            SockAPIClient.lock.release()
-            if len(datall) > 0:
-                # print("receive: " + str(datall))
-                # unpack all
-                all_frames = datall.split(NPArray._MAGIC_BYTES)
-                all_arrs = [
-                    NPArray.from_msg(m2)
-                    for m2 in all_frames
-                    if len(m2) >= NPArray._HEADER_SIZE + 1
-                    and int.from_bytes(m2[:4], "little")
-                    == len(m2[NPArray._HEADER_SIZE :])
-                ]
-                # missing frames / incomplete?
-                if len(all_arrs) > 0:
-                    # received valid data
-                    for nparr in all_arrs:
-                        EntityBase._sync_incoming_data(nparr)
-                        if nparr.unique_name == "SimEnvManager.Current.SimTime":
-                            if last_sim_time != nparr.get_float():
-                                update_receive = True
-                            last_sim_time = nparr.get_float()
-                            
-                if len(all_arrs) != len(all_frames):
-                    datall = bytearray() + all_frames[-1]  # keep leftovers
-                else:
-                    datall = bytearray()
-
-            if _debugger_is_active() == False and (datetime.utcnow() - EntityBase.last_receive_at).total_seconds() > SockAPIClient.TIMEOUT:
-                break
-            time.sleep(0.005)
-            EntityBase._clean_entity_dict()
-            if update_receive:
-                EntityBase.last_receive_at = datetime.utcnow()
-            # log.info("receive")
-
-        connection.close()
+    def wakeup():
+        """signal the io thread that new outgoing data was queued. cheap if a wakeup is already pending."""
+        if SockAPIClient._wakeup_pending:
+            return
+        SockAPIClient._wakeup_pending = True
+        try:
+            SockAPIClient._wakeup_w.send(b"\x00")
+        except OSError:
+            pass  # wakeup socket full, the io thread is awake anyway
 
     @staticmethod
-    def threaded_send(connection: socket.socket):
-        #time.sleep(0.2112456)
-        # connection.send(str.encode('Welcome to the Servern'))
-        data = b""
-        iloop = 5
-        while True:
-            did_send = False
-            if len(EntityBase._out_dict) > 0:
-                EntityBase.sendlock.acquire()
-                out_dict = copy.deepcopy(EntityBase._out_dict)
-                EntityBase._out_dict = dict()  # clear
-                EntityBase.sendlock.release()
-                # out_items = out_dict.items()
-
-                # pack data sequentially
-                l = [num for sublist in [v for k, v in out_dict.items() if len(v) > 0] for num in sublist]
-                l.sort(key = lambda v: v.time_id)
-                flat_list = [num.pack_msg() for num in l]
-                if _is_custom_level_runner() == False and iloop % 10 == 0:
-                    k = "SimEnvManager.Current.MemUsg"
-                    nparr = NPArray(k, np.asarray([get_memory_usage()], dtype=np.float32))
-                    flat_list.append(nparr.pack_msg())
-                
-                data = b"".join(flat_list)
-
-                SockAPIClient.lock.acquire()
+    def threaded_io(connection: socket.socket, session: Session):
+        """single io loop for the connection of the given session. blocks in select until the socket is readable, writable (while data is pending) or the wakeup socket signals queued commands."""
+        session.bind_thread()
+        sel = selectors.DefaultSelector()
+        sel.register(connection, selectors.EVENT_READ)
+        sel.register(SockAPIClient._wakeup_r, selectors.EVENT_READ)
+        decoder = FrameDecoder(SockAPIClient.BUF_SIZE)
+        SockAPIClient._last_sim_time = -10.0
+        last_mem_usage = 0.0
+        last_log_flush = 0.0
+        is_writing = False
+        try:
+            while True:
                 try:
-                    # while sent
-                    while len(data) > 0:
-                        len_sent = connection.send(data)
-                        did_send = True
-                        # print("sent " + str(len_sent))
-                        data = data[len_sent:]
-                except socket.error as e:
-                    if not (e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK):
-                        SockAPIClient.lock.release()
+                    events = sel.select(timeout=0.5)
+                except (OSError, ValueError):
+                    break  # socket closed by disconnect
+                update_receive = False
+                for key, mask in events:
+                    if key.fileobj is SockAPIClient._wakeup_r:
+                        SockAPIClient._drain_wakeup()
+                        continue
+                    if mask & selectors.EVENT_READ:
+                        all_arrs = SockAPIClient._receive_available(connection, decoder)
+                        if all_arrs is None:
+                            return  # connection closed
+                        update_receive = SockAPIClient._sync_frames(all_arrs) or update_receive
+
+                if update_receive:
+                    EntityBase._release_tick_aligned()
+                    SockAPIClient._on_receive_tick()
+
+                # logs go out once per tick, or after a while if the SimEnv does not tick
+                if len(EntityBase._log_pipeline) > 0 and (update_receive or time.monotonic() - last_log_flush > SockAPIClient.LOG_FLUSH_INTERVAL):
+                    last_log_flush = time.monotonic()
+                    EntityBase._log_pipeline.flush()
+
+                # send everything queued so far
+                if len(EntityBase._out_queue) > 0:
+                    l = EntityBase._take_out_data(SockAPIClient._pending.nbytes)
+                    SockAPIClient.lock.acquire()
+                    for num in l:
+                        SockAPIClient._pending.extend(num.pack_parts())
+                    SockAPIClient.lock.release()
+
+                if len(SockAPIClient._pending) > 0:
+                    SockAPIClient.lock.acquire()
+                    try:
+                        did_send = SockAPIClient._pending.write(connection) > 0
+                    except socket.error:
                         break
-                SockAPIClient.lock.release()
-                if did_send:
-                    EntityBase.last_send_at = datetime.utcnow()
-                    iloop += 1
-            if _debugger_is_active() == False and (datetime.utcnow() - EntityBase.last_receive_at).total_seconds() > SockAPIClient.TIMEOUT:
-                break
-            time.sleep(0.005)
-            # log.info("sent")
+                    finally:
+                        SockAPIClient.lock.release()
+                    if did_send:
+                        EntityBase.last_send_ns = time.monotonic_ns()
+                        EntityBase._send_ticks.notify()
+                    # measured after sending, collecting garbage must not delay commands
+                    if time.monotonic() - last_mem_usage > SockAPIClient.MEM_USAGE_INTERVAL:
+                        last_mem_usage = time.monotonic()
+                        SockAPIClient._queue_memory_usage()
+
+                # only wait for writability while the socket buffer is full or lower priority frames are left
+                if (len(SockAPIClient._pending) > 0 or len(EntityBase._out_queue) > 0) != is_writing:
+                    is_writing = not is_writing
+                    sel.modify(connection, selectors.EVENT_READ | selectors.EVENT_WRITE if is_writing else selectors.EVENT_READ)
+
+                if time.monotonic_ns() - EntityBase.last_receive_ns > SockAPIClient.TIMEOUT * 1_000_000_000 and _debugger_is_active() == False:
+                    break
+        finally:
+            sel.close()
+            connection.close()
+            SimEnv._is_connected = False
+            EntityBase._receive_ticks.close()
+            EntityBase._send_ticks.close()
+            EntityBase._sim_scheduler.close()
 
-        connection.close()
+    @staticmethod
+    def _sync_frames(all_arrs: List[NPArray]) -> bool:
+        """replicate received frames. returns true if the sim time advanced."""
+        now = time.monotonic_ns()
+        sim_time = SockAPIClient._last_sim_time
+        for nparr in all_arrs:
+            if nparr.unique_name == "SimEnvManager.Current.SimTime":
+                tick_time = nparr.get_float()
+                if tick_time != sim_time:
+                    # several ticks may arrive in one read, each of them counts for step()
+                    EntityBase._count_lockstep_tick()
+                sim_time = tick_time
+        for nparr in all_arrs:
+            EntityBase._sync_incoming_data(nparr, now, sim_time)
+        if sim_time < SockAPIClient._last_sim_time:
+            # the SimEnv was reset, commands sent before must be sent again
+            EntityBase._last_sent = dict()
+        update_receive = sim_time != SockAPIClient._last_sim_time
+        SockAPIClient._last_sim_time = sim_time
+        if update_receive:
+            EntityBase._sim_scheduler.update(sim_time, now)
+        if not EntityBase._event_queue.empty():
+            # let sleeping scripts run their event handlers
+            EntityBase._sim_scheduler.interrupt()
+        EntityBase._clean_entity_dict()
+        return update_receive
 
     @staticmethod
-    def _force_send_manual(connection: socket.socket, *args:NPArray):
-        flat_list = [num.pack_msg() for num in args]
-        data = b"".join(flat_list)
+    def _on_receive_tick():
+        EntityBase.last_receive_ns = time.monotonic_ns()
+        EntityBase._receive_ticks.notify()
+
+    @staticmethod
+    def _queue_memory_usage():
+        if _is_custom_level_runner() == False:
+            k = "SimEnvManager.Current.MemUsg"
+            EntityBase._set_out_data(k, NPArray(k, np.asarray([get_memory_usage()], dtype=np.float32)))
 
+    @staticmethod
+    def _receive_available(connection: socket.socket, decoder: FrameDecoder) -> Optional[List[NPArray]]:
+        """read everything available without blocking and decode it. returns None once the connection is closed."""
+        all_arrs: List[NPArray] = []
         try:
-            # while sent
-            while len(data) > 0:
-                len_sent = connection.send(data)
-                data = data[len_sent:]
+            while True:
+                n = connection.recv_into(decoder.buffer())
+                if n == 0:
+                    # connection closed by the SimEnv
+                    return None
+                all_arrs.extend(decoder.feed_buffer(n))
         except socket.error as e:
             if not (e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK):
-                return
+                return None
+        return all_arrs
+
+    @staticmethod
+    def _drain_wakeup():
+        """empty the wakeup socket, then accept new wakeups. clearing the flag first would lose a wakeup whose byte is drained right after it was sent."""
+        try:
+            while SockAPIClient._wakeup_r.recv(4096):
+                pass
+        except OSError:
+            pass
+        # commands queued before this point are sent further down in the same io loop pass
+        SockAPIClient._wakeup_pending = False
+
+    @staticmethod
+    def _force_send_manual(connection: socket.socket, *args:NPArray):
+        # queue behind partially sent frames of the io thread to keep frame boundaries intact
+        SockAPIClient.lock.acquire()
+        try:
+            for num in args:
+                SockAPIClient._pending.extend(num.pack_parts())
+            SockAPIClient._pending.write(connection)
+        except socket.error:
+            return
+        finally:
+            SockAPIClient.lock.release()
+        SockAPIClient.wakeup()
             
     @staticmethod
     def _debug_pause():
         SockAPIClient._force_send_manual(SimEnv._client_socket, NPArray("SimEnvManager.Current.setTimeDilation", np.asarray([0], dtype=np.float32)))
         
-        out_dict = copy.deepcopy(EntityBase._out_dict)
-        EntityBase._out_dict = dict()
-        l = [num for sublist in [v for k, v in out_dict.items() if len(v) > 0] for num in sublist]
-        l.sort(key = lambda v: v.time_id)
+        EntityBase._log_pipeline.flush()
+        l = EntityBase._take_out_data()
         SockAPIClient._force_send_manual(SimEnv._client_socket,*l)
         EntityBase._is_debug_paused = True
         
@@ -165,11 +372,266 @@ class SockAPIClient:
         
         
 
-class SimEnv:
-    """Python class for communicating with the current Simulation Environment. Use the SimEnvManager class once you are connected."""
+class AsyncSockAPIClient(asyncio.BufferedProtocol):
+    """asyncio transport for the SimEnv using the same NPArray framing as SockAPIClient. Received chunks are read straight into the receive buffer of the FrameDecoder. Sim ticks resolve awaiting tasks and dispatch events on the loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.decoder = FrameDecoder(SockAPIClient.BUF_SIZE)
+        self.transport: Optional[asyncio.Transport] = None
+        self._wakeup = asyncio.Event()
+        self._wakeup_pending = False
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+        self._tick_waiters: List[asyncio.Future] = []
+        self._writer_task: Optional[asyncio.Task] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            # commands are sent as soon as they are queued, do not hold back small writes
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        SockAPIClient._last_sim_time = -10.0
+        self._writer_task = self.loop.create_task(self._write_loop())
+
+    def get_buffer(self, sizehint):
+        return self.decoder.buffer()
+
+    def buffer_updated(self, nbytes):
+        if SockAPIClient._sync_frames(self.decoder.feed_buffer(nbytes)):
+            if EntityBase._release_tick_aligned() or len(EntityBase._log_pipeline) > 0:
+                EntityBase._log_pipeline.flush()
+                self.wakeup()
+            SockAPIClient._on_receive_tick()
+            for fut in self._tick_waiters:
+                if not fut.done():
+                    fut.set_result(True)
+            self._tick_waiters = []
+            _dispatch_events()
+
+    def connection_lost(self, exc):
+        SimEnv._is_connected = False
+        EntityBase._receive_ticks.close()
+        EntityBase._send_ticks.close()
+        EntityBase._sim_scheduler.close()
+        for fut in self._tick_waiters:
+            if not fut.done():
+                fut.set_result(False)
+        self._tick_waiters = []
+        self._can_write.set()
+        self._wakeup.set()
+
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    def wakeup(self):
+        """signal the writer task that new outgoing data was queued. thread-safe and cheap if a wakeup is already pending."""
+        if self._wakeup_pending:
+            return
+        self._wakeup_pending = True
+        try:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    async def tick(self, timeout: float) -> bool:
+        if self.transport is None or self.transport.is_closing():
+            return False
+        fut = self.loop.create_future()
+        self._tick_waiters.append(fut)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return SimEnv._is_connected
+
+    async def _write_loop(self):
+        last_mem_usage = 0.0
+        last_log_flush = 0.0
+        while self.transport is not None and not self.transport.is_closing():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._wakeup_pending = False
+            await self._can_write.wait()
+            if self.transport.is_closing():
+                break
+            if len(EntityBase._log_pipeline) > 0 and time.monotonic() - last_log_flush > SockAPIClient.LOG_FLUSH_INTERVAL:
+                last_log_flush = time.monotonic()
+                EntityBase._log_pipeline.flush()
+            if len(EntityBase._out_queue) > 0:
+                buffers = []
+                for num in EntityBase._take_out_data(self.transport.get_write_buffer_size()):
+                    buffers.extend(num.pack_parts())
+                self.transport.writelines(buffers)
+                if len(EntityBase._out_queue) > 0:
+                    # lower priority frames are left over, come back once the transport made progress
+                    self.loop.call_later(0.001, self.wakeup)
+                EntityBase.last_send_ns = time.monotonic_ns()
+                EntityBase._send_ticks.notify()
+                if time.monotonic() - last_mem_usage > SockAPIClient.MEM_USAGE_INTERVAL:
+                    last_mem_usage = time.monotonic()
+                    SockAPIClient._queue_memory_usage()
+            if time.monotonic_ns() - EntityBase.last_receive_ns > SockAPIClient.TIMEOUT * 1_000_000_000 and _debugger_is_active() == False:
+                self.transport.close()
+
+
+class LoopTick:
+    """One iteration of a fixed-rate control loop, see SimEnv.loop()."""
+
+    def __init__(self, index: int, sim_time: float, dt: float, dropped: int, overrun: float, late: float) -> None:
+        self.index: int = index
+        """Number of this tick, counting from 0 (dropped ticks included)."""
+        self.sim_time: float = sim_time
+        """Simulation time in seconds at the start of this tick."""
+        self.dt: float = dt
+        """Seconds since the previous tick. Sim seconds for align="sim", wall-clock seconds for align="wall"."""
+        self.dropped: int = dropped
+        """Number of ticks skipped right before this one, because their deadline had already passed."""
+        self.overrun: float = overrun
+        """Wall-clock seconds the loop body of the previous tick took longer than one period. 0 if the loop kept up."""
+        self.late: float = late
+        """Seconds this tick started after its deadline."""
+
+    def __repr__(self) -> str:
+        s = ""
+        for k,v in self.__dict__.items():
+            s += f"{k}: {str(v)}\n"
+        return s
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+class ControlLoop:
+    """Fixed-rate control loop returned by SimEnv.loop(). Iterate over it to get one LoopTick per period while the connection is active. Keeps rolling statistics of the last ticks, see stats()."""
+
+    def __init__(self, hz: float, align: str = "sim", window: int = 600) -> None:
+        if hz <= 0:
+            raise ValueError("hz must be greater than 0")
+        if align not in ("sim", "wall"):
+            raise ValueError('align must be "sim" or "wall"')
+        self.hz = hz
+        self.period = 1.0 / hz
+        self.align = align
+        self.ticks = 0
+        """number of ticks run so far"""
+        self.dropped = 0
+        """number of ticks skipped so far"""
+        self.overruns = 0
+        """number of ticks whose loop body took longer than one period"""
+        self.missed: Deque[Tuple[int, float, int]] = deque(maxlen=window)
+        """(tick index, sim time, number of dropped ticks) of the last ticks that had ticks dropped before them"""
+        self._dt: Deque[float] = deque(maxlen=window)
+        self._busy: Deque[float] = deque(maxlen=window)
+        self._late: Deque[float] = deque(maxlen=window)
+
+    @staticmethod
+    def _sim_time() -> float:
+        nparr = EntityBase._in_dict.get("SimEnvManager.Current.SimTime")
+        return nparr.get_float() if nparr is not None else -1.0
+
+    def _now(self) -> float:
+        return time.monotonic() if self.align == "wall" else ControlLoop._sim_time()
+
+    def _wait_until(self, deadline: float):
+        if self.align == "wall":
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            return
+        scheduler = EntityBase._sim_scheduler
+        sleeper = scheduler.add(deadline)
+        while not scheduler.wait(sleeper):
+            _dispatch_events()
+
+    def __iter__(self) -> Iterator[LoopTick]:
+        if _in_event_loop():
+            raise JoyfulException("SimEnv.loop() would block the event loop, use 'while await SimEnv.tick()' instead.")
+        start = self._now()
+        if start < 0:
+            await_receive()
+            start = self._now()
+        k = 0
+        last = start
+        yielded_at = None
+        while SimEnv._is_connected:
+            busy = 0.0 if yielded_at is None else time.monotonic() - yielded_at
+            deadline = start + k * self.period
+            self._wait_until(deadline)
+            _dispatch_events()
+            if not SimEnv._is_connected:
+                return
+            now = self._now()
+            if now < last:
+                # the SimEnv was reset, restart the schedule
+                start, k, deadline, last = now, 0, now, now
+            # sim time only advances with the ticks of the SimEnv, the waiting may return slightly early
+            dropped = max(0, int((now - deadline) / self.period))
+            k += dropped
+            deadline = start + k * self.period
+            budget = self.period
+            if self.align == "sim" and EntityBase._sim_scheduler.rate > 0:
+                budget /= EntityBase._sim_scheduler.rate
+            overrun = max(0.0, busy - budget)
+            late = max(0.0, now - deadline)
+            sim_time = now if self.align == "sim" else ControlLoop._sim_time()
+            tick = LoopTick(k, sim_time, now - last, dropped, overrun, late)
+            self.ticks += 1
+            self.dropped += dropped
+            if overrun > 0:
+                self.overruns += 1
+            if dropped > 0:
+                self.missed.append((k, tick.sim_time, dropped))
+            if yielded_at is not None:
+                self._dt.append(tick.dt)
+                self._busy.append(busy)
+            self._late.append(late)
+            last = now
+            k += 1
+            yielded_at = time.monotonic()
+            yield tick
+
+    def stats(self, percentiles: Sequence[float] = (50, 90, 99)) -> Dict[str, Any]:
+        """Rolling statistics of the last ticks: percentiles and maximum of dt, busy (wall-clock seconds spent in the loop body) and late (seconds a tick started after its deadline), plus the totals ticks, dropped and overruns.
+
+        Args:
+            percentiles (Sequence[float], optional): Percentiles to compute. Defaults to (50, 90, 99).
+
+        Example:
+            >>>
+            loop = SimEnv.loop(hz=30)
+            for tick in loop:
+                if tick.index % 300 == 0:
+                    print(loop.stats()["busy"])
+        """
+        res: Dict[str, Any] = {"ticks": self.ticks, "dropped": self.dropped, "overruns": self.overruns}
+        for name, values in (("dt", self._dt), ("busy", self._busy), ("late", self._late)):
+            if len(values) == 0:
+                continue
+            arr = np.asarray(values)
+            res[name] = {f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(arr, percentiles))}
+            res[name]["max"] = float(arr.max())
+        return res
+
+    def __str__(self) -> str:
+        s = f"{self.hz:g} Hz {self.align} loop: {self.ticks} ticks, {self.dropped} dropped, {self.overruns} overruns"
+        stats = self.stats((50, 99))
+        for name in ("dt", "busy", "late"):
+            if name in stats:
+                s += f", {name} p50 {stats[name]['p50']*1000:.1f} ms p99 {stats[name]['p99']*1000:.1f} ms"
+        return s
 
-    _is_connected = False
-    _client_socket = socket.socket()
+
+class SimEnv(metaclass=_session_scoped("_is_connected", "_client_socket", "_async_client", "main_counter")):
+    """Python class for communicating with the current Simulation Environment. Use the SimEnvManager class once you are connected. To connect to several SimEnv instances from one process use one Session per instance."""
+
+    # the connection state is an attribute of the current Session
 
     @staticmethod
     def connect(host="127.0.0.1", port=18189) -> bool:
@@ -184,16 +646,7 @@ class SimEnv:
         """
         if SimEnv._is_connected:
             return True
-        EntityBase._out_dict = dict()
-        EntityBase._in_dict = dict()
-        EntityBase._entity_dict = dict()
-        custom_classes = _find_all_entity_classes_rec()
-        if len(custom_classes) > 0:  # convert to dict
-            EntityBase._custom_classes = {
-                c.__name__: c
-                for c in custom_classes
-                if inspect.isclass(c) and issubclass(c, EntityBase)
-            }
+        SimEnv._reset_state()
 
         client_socket = socket.socket()
         client_socket.setsockopt(
@@ -210,26 +663,20 @@ class SimEnv:
             return False
 
         client_socket.setblocking(False)
+        # commands are sent as soon as they are queued, do not hold back small writes
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
-        # start sender / recv threads
+        # start io thread
+        SockAPIClient._pending = SendBuffer()
+        SockAPIClient._drain_wakeup()
+        EntityBase._wakeup_sender = SockAPIClient.wakeup
         t1 = threading.Thread(
-            target=SockAPIClient.threaded_receive, args=(client_socket,)
+            target=SockAPIClient.threaded_io, args=(client_socket, Session.current())
         )
-        t2 = threading.Thread(target=SockAPIClient.threaded_send, args=(client_socket,))
 
         SimEnv._is_connected = True
         t1.start()
-        t2.start()
-
-        t3 = threading.Thread(
-            target=SimEnv.__observe_threads__,
-            args=(
-                client_socket,
-                t1,
-                t2,
-            ),
-        )
-        t3.start()
+
         time.sleep(0.7)
         while True:
             print(".", end="")
@@ -250,39 +697,156 @@ class SimEnv:
         return True
 
     @staticmethod
-    def __observe_threads__(cSock, t1, t2):
-        t1.join()
-        t2.join()
-        # done
+    def _reset_state():
+        Session.current().reset()
+        EntityBase._event_loop = None
+        SimEnv._async_client = None
+        custom_classes = _find_all_entity_classes_rec()
+        if len(custom_classes) > 0:  # convert to dict
+            EntityBase._custom_classes = {
+                c.__name__: c
+                for c in custom_classes
+                if inspect.isclass(c) and issubclass(c, EntityBase)
+            }
+
+    @staticmethod
+    async def connect_async(host="127.0.0.1", port=18189) -> bool:
+        """connect to the SimEnv instance from within a running asyncio event loop. returns true on success. Afterwards use 'await SimEnv.tick()', 'await sleep_async()' and coroutine event handlers instead of blocking calls, so many controllers can run as tasks on one loop.
 
-        cSock.close()
-        if SockAPIClient.lock.locked():
-            SockAPIClient.lock.release()
-        SimEnv._is_connected = False
+        Args:
+            host (str, optional): Host pc running the SimEnv. Defaults to localhost at "127.0.0.1".
+            port (int, optional): Port on which the SimEnv is being hosted. Defaults to 18189.
+
+        Returns:
+            bool: true on successful connection.
+
+        Example:
+            >>>
+            import asyncio
+            from pyjop import *
+
+            async def drive(belt:ConveyorBelt):
+                while await SimEnv.tick():
+                    belt.set_target_speed(5)
+                    await sleep_async(1)
+                    belt.set_target_speed(0)
+                    await sleep_async(1)
+
+            async def main():
+                await SimEnv.connect_async()
+                await asyncio.gather(*[drive(b) for b in ConveyorBelt.find_all()])
 
+            asyncio.run(main())
+        """
+        if SimEnv._is_connected:
+            return True
+        if Session.current() is not Session.default:
+            raise JoyfulException("SimEnv.connect_async() only supports the default session, use SimEnv.connect() inside other sessions.")
+        SimEnv._reset_state()
+        loop = asyncio.get_running_loop()
+        client = AsyncSockAPIClient(loop)
+        try:
+            await loop.create_connection(lambda: client, host, port)
+        except OSError:
+            return False
+        SimEnv._async_client = client
+        EntityBase._event_loop = loop
+        EntityBase._wakeup_sender = client.wakeup
+        SimEnv._is_connected = True
+
+        while SimEnv._is_connected and len(EntityBase._entity_dict) == 0:
+            await client.tick(0.25)
+        EntityBase._log_debug_static("pyjop connection established")
+        SockAPIClient._queue_memory_usage()
+        await SimEnv.tick()
+
+        return SimEnv._is_connected
+
+    @staticmethod
+    async def tick(timeout=3) -> bool:
+        """wait for the next tick of the SimEnv without blocking the event loop. Only available after SimEnv.connect_async. Returns true while the connection is active.
+
+        Example:
+            >>>
+            while await SimEnv.tick():
+                print(SimEnvManager.first().get_sim_time())
+        """
+        if SimEnv._async_client is None:
+            raise JoyfulException("SimEnv.tick() requires SimEnv.connect_async(), use SimEnv.run_main() otherwise.")
+        return await SimEnv._async_client.tick(timeout)
 
+    @staticmethod
+    def batch(align_to_tick=False) -> CommandBatch:
+        """collect all commands sent inside a with block (or a decorated function) and send them together as one write, so multi-entity updates reach the SimEnv at once. Can also decorate a function without parentheses. With align_to_tick=True the commands are held back until the next tick of the SimEnv arrives. Commands are dropped if the block raises an exception.
+
+        Args:
+            align_to_tick (bool, optional): True to send the batch right after the next tick of the SimEnv was received. Defaults to False.
+
+        Example:
+            >>>
+            with SimEnv.batch():
+                ConveyorBelt.find("belt0").set_target_speed(0)
+                RobotArm.first().set_grabber_location(Vector3(1,0,0))
+                DeliveryContainer.first().open_door()
+
+            @SimEnv.batch(align_to_tick=True)
+            def stop_all():
+                for belt in ConveyorBelt.find_all():
+                    belt.set_target_speed(0)
+        """
+        if callable(align_to_tick):
+            # used as @SimEnv.batch without parentheses
+            return CommandBatch()(align_to_tick)
+        return CommandBatch(align_to_tick)
+
+    @staticmethod
+    def set_command_dedup(enabled=True, refresh_interval=1.0):
+        """skip commands that would set the same value again, for example calling set_target_speed(5) every tick. A repeated command is still sent once its last send is older than refresh_interval seconds, and everything is sent again after the SimEnv was reset. Only affects setters of the current Session. Disabled by default.
+
+        Args:
+            enabled (bool, optional): True to drop repeated commands. Defaults to True.
+            refresh_interval (float, optional): Seconds after which an unchanged command is sent again anyway. Defaults to 1.0.
+
+        Example:
+            >>>
+            SimEnv.set_command_dedup(True, refresh_interval=0.5)
+            car = RaceCar.first()
+            while SimEnv.run_main():
+                car.set_throttle(0.8) #only sent twice per second while unchanged
+        """
+        EntityBase._dedup_refresh_interval = refresh_interval
+        EntityBase._last_sent = dict()
+        EntityBase._dedup_enabled = enabled
 
-    main_counter = 0
+    @staticmethod
+    def loop(hz: float = 60, align: str = "sim", window: int = 600) -> ControlLoop:
+        """run a fixed-rate control loop while the connection is active. Each iteration yields a LoopTick with the sim time, the time since the last tick, the number of dropped ticks and the overrun of the previous loop body. Ticks whose deadline already passed are dropped instead of running late ones back to back. The returned loop keeps rolling percentile statistics, see ControlLoop.stats().
+
+        Args:
+            hz (float, optional): Ticks per second. Defaults to 60.
+            align (str, optional): "sim" to count periods in SimEnv seconds (scaled with the time dilation), "wall" to count them in wall-clock seconds. Defaults to "sim".
+            window (int, optional): Number of recent ticks the statistics are computed over. Defaults to 600.
+
+        Example:
+            >>>
+            car = RaceCar.first()
+            loop = SimEnv.loop(hz=30)
+            for tick in loop:
+                car.set_throttle(0.8)
+                if tick.dropped > 0:
+                    print(f"missed {tick.dropped} ticks before {tick.sim_time:.2f}")
+            print(loop) #summary of dt, busy and late percentiles
+        """
+        return ControlLoop(hz, align, window)
 
     @staticmethod
     def run_main() -> bool:
         """run the main loop and exchange data with the SimEnv inside the loop while the connection is active. waits for one tick."""
 
-        # SimEnv.await_tick()
-
-        last_update = EntityBase.last_receive_at
-        time.sleep(0.01)
-        #sim_update = float(EntityBase._in_dict["SimEnvManager.Current.SimTime"].array_data[0][0][0])
+        last_update = EntityBase._receive_ticks.tick
         # wait for update
-        start = 0.0
-        while (
-            SimEnv.main_counter > 0 and
-            last_update == EntityBase.last_receive_at
-            and start < 3
-            and SimEnv._is_connected
-        ):
-            time.sleep(0.002)
-            start += 0.002
+        if SimEnv.main_counter > 0 and SimEnv._is_connected:
+            EntityBase._receive_ticks.wait(last_update, 3)
 
         SimEnv.main_counter += 1
             
@@ -301,6 +865,8 @@ class SimEnv:
         time.sleep(0.6)
         SimEnv._is_connected = False
         SimEnv._client_socket.close()
+        # release scripts sleeping in other threads
+        EntityBase._sim_scheduler.close()
         time.sleep(0.1)
         sys.exit()
 
@@ -1,6 +1,17 @@
 __pdoc__ = {}
 __pdoc__["EntityBase.NPArray"] = False
 __pdoc__["Network.SockAPIClient"] = False
+__pdoc__["Network.FrameDecoder"] = False
+__pdoc__["Network.SendBuffer"] = False
+__pdoc__["Network.AsyncSockAPIClient"] = False
+__pdoc__["EntityBase.CommandQueue"] = False
+__pdoc__["EntityBase.CommandBatch"] = False
+__pdoc__["EntityBase.LogPipeline"] = False
+__pdoc__["EntityBase.ImageLogEncoder"] = False
+__pdoc__["EntityBase.EntityIndex"] = False
+__pdoc__["EntityBase.SensorHistory"] = False
+__pdoc__["EntityBase.FrameRing"] = False
+__pdoc__["EntityBase.SimTimeScheduler"] = False
 
 __a = set(dir())
 
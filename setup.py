@@ -27,7 +27,6 @@ REQUIRED = [
     'matplotlib',
     'pandas',
     'scipy',
-    'scikit-image',
     'Pillow',
     'scikit-learn',
     'psutil',
@@ -35,7 +34,7 @@ REQUIRED = [
     'statsmodels',
     'opencv-contrib-python-headless', #remove ffmpeg
     'nicegui==1.1.5', #remove docutils, keep bidict
-    'gymnasium',
+    'gymnasium>=1.1', # gymnasium.vector.AutoresetMode
     'neatpy',
     'mypy',
     'tinygrad',
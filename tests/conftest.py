@@ -0,0 +1,34 @@
+import socket
+import time
+
+import pytest
+
+from pyjop.EntityBase import Session
+from pyjop.Loopback import LoopbackServer
+from pyjop.Network import SimEnv
+
+
+@pytest.fixture
+def loopback():
+    """connect a new Session to a new LoopbackServer, called with the step function and the LoopbackServer arguments. returns the server and the session, make calls for it inside `with session:`."""
+    opened = []
+
+    def connect(step, **kwargs):
+        server = LoopbackServer(step, **kwargs).start()
+        session = Session()
+        opened.append((server, session))
+        with session:
+            assert SimEnv.connect(port=server.port)
+        return server, session
+
+    yield connect
+    for server, session in opened:
+        with session:
+            if SimEnv._is_connected:
+                SimEnv._client_socket.shutdown(socket.SHUT_RDWR)
+            deadline = time.monotonic() + 5
+            while SimEnv._is_connected and time.monotonic() < deadline:
+                time.sleep(0.01)
+        server.stop()
+        session.close()
+
@@ -0,0 +1,136 @@
+import time
+
+import numpy as np
+import pytest
+
+from pyjop.EntityBase import CommandQueue, EntityBase, NPArray
+from pyjop.EntityClasses import RaceCar, SimEnvManager
+from pyjop.Network import SimEnv
+
+CARS = ("c0", "c1", "c2", "c3")
+
+
+class Recorder:
+    """step function for the LoopbackServer that records the commands received in every tick"""
+
+    def __init__(self) -> None:
+        self.ticks = []
+
+    def __call__(self, sim_time, commands):
+        self.ticks.append(commands)
+        return {f"RaceCar.{name}.Speed": [float(i)] for i, name in enumerate(CARS)}
+
+    def received(self, name):
+        """values of the command in the ticks it was received in"""
+        return [float(np.ravel(commands[name])[0]) for commands in self.ticks if name in commands]
+
+    def wait_for(self, name, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not any(name in commands for commands in self.ticks) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def queue(k: str, arr: NPArray):
+    """queue a frame without waking the sender"""
+    arr.time_id = next(NPArray.time_id_it)
+    EntityBase._out_queue.put(k, arr)
+
+
+def test_lane_budgets():
+    q = CommandQueue()
+    for i in range(4):
+        k = f"SmartCamera.cam.setBulk{i}"
+        q.put(k, NPArray(k, np.zeros(40000, dtype=np.uint8)))
+    k = "RaceCar.c0.setThrottle"
+    q.put(k, NPArray(k, np.asarray([1.0], dtype=np.float32)))
+    # control frames always go out, bulk frames only as far as their budget reaches
+    assert [arr.unique_name for arr in q.take()] == ["RaceCar.c0.setThrottle", "SmartCamera.cam.setBulk0"]
+    # with bytes still pending, a frame larger than the rest of the budget waits
+    assert q.take(pending_bytes=30000) == []
+    assert [arr.unique_name for arr in q.take()] == ["SmartCamera.cam.setBulk1"]
+    assert len(q) == 2
+
+
+def test_lane_order_on_the_wire(loopback):
+    recorder = Recorder()
+    server, session = loopback(recorder, lockstep=True)
+    with session:
+        lvl = SimEnvManager.first()
+        lvl.set_lockstep(True)
+        with EntityBase.sendlock:
+            for i in range(4):
+                k = f"SmartCamera.cam.setBulk{i}"
+                queue(k, NPArray(k, np.full(40000, i, dtype=np.uint8)))
+            k = "SmartCamera.cam.LogDebug"
+            queue(k, NPArray(k, np.zeros(16, dtype=np.uint8)))
+            k = "RaceCar.c0.setThrottle"
+            queue(k, NPArray(k, np.asarray([0.5], dtype=np.float32)))
+        EntityBase._wakeup_sender()
+        deadline = time.monotonic() + 5
+        while len(EntityBase._out_queue) > 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        lvl.step()
+        names = [k for k in recorder.ticks[-1] if k.startswith("SmartCamera") or k.endswith("setThrottle")]
+        # control before telemetry before bulk, each lane in the order it was queued
+        assert names == ["RaceCar.c0.setThrottle", "SmartCamera.cam.LogDebug"] + [f"SmartCamera.cam.setBulk{i}" for i in range(4)]
+        for i in range(4):
+            assert np.all(recorder.ticks[-1][f"SmartCamera.cam.setBulk{i}"] == i)
+
+
+def test_dedup_skips_repeated_commands(loopback):
+    recorder = Recorder()
+    server, session = loopback(recorder, lockstep=True)
+    with session:
+        lvl = SimEnvManager.first()
+        lvl.set_lockstep(True)
+        car = RaceCar.find("c0")
+        for _ in range(3):
+            car.set_throttle(0.5)
+            lvl.step()
+        assert recorder.received("RaceCar.c0.setThrottle") == [0.5, 0.5, 0.5]
+
+        SimEnv.set_command_dedup(True, refresh_interval=60)
+        for val in (0.25, 0.25, 0.25, 0.75):
+            car.set_throttle(val)
+            lvl.step()
+        assert recorder.received("RaceCar.c0.setThrottle")[3:] == [0.25, 0.75]
+
+        # the acknowledgements of step() repeat the same time dilation and must never be skipped
+        ticks = server.ticks
+        for _ in range(3):
+            car.set_throttle(0.75)
+            lvl.step()
+        assert server.ticks == ticks + 3
+        assert recorder.received("RaceCar.c0.setThrottle")[5:] == []
+
+
+def test_batch_arrives_in_one_tick(loopback):
+    recorder = Recorder()
+    server, session = loopback(recorder, dt=1 / 100)
+    with session:
+        cars = [RaceCar.find(name) for name in CARS]
+        with SimEnv.batch():
+            for i, car in enumerate(cars):
+                car.set_throttle(0.1 * (i + 1))
+                time.sleep(0.03)  # spans several ticks
+            assert all(not recorder.received(f"RaceCar.{name}.setThrottle") for name in CARS)
+        recorder.wait_for("RaceCar.c0.setThrottle")
+        time.sleep(0.1)
+        ticks = [set(k for k in commands if k.endswith("setThrottle")) for commands in recorder.ticks]
+        assert [names for names in ticks if names] == [set(f"RaceCar.{name}.setThrottle" for name in CARS)]
+
+
+def test_batch_dropped_on_error(loopback):
+    recorder = Recorder()
+    server, session = loopback(recorder, dt=1 / 100)
+    with session:
+        cars = [RaceCar.find(name) for name in CARS]
+        with pytest.raises(RuntimeError):
+            with SimEnv.batch():
+                for car in cars:
+                    car.set_throttle(1.0)
+                raise RuntimeError("abort")
+        cars[0].set_brake(1.0)
+        recorder.wait_for("RaceCar.c0.setBrake")
+        time.sleep(0.1)
+        assert all(not recorder.received(f"RaceCar.{name}.setThrottle") for name in CARS)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from pyjop.EntityClasses import RaceCar, SimEnvManager, SmartCamera
+
+CARS = ("c0", "c1", "c2")
+
+
+class Fleet:
+    """step function for the LoopbackServer with a few race cars and a camera whose image changes every tick"""
+
+    def __init__(self) -> None:
+        self.commands = dict()
+
+    def __call__(self, sim_time, commands):
+        self.commands = commands
+        tick = int(round(sim_time * 60))
+        obs = {f"RaceCar.{name}.Speed": [10.0 * i] for i, name in enumerate(CARS)}
+        obs.update({f"RaceCar.{name}.Location": [i, 2 * i, 3 * i] for i, name in enumerate(CARS)})
+        obs["SmartCamera.cam.CameraFrame"] = ((np.arange(16 * 16 * 4).reshape(16, 16, 4) + tick) % 256).astype(np.uint8)
+        return obs
+
+
+def test_gather(loopback):
+    server, session = loopback(Fleet(), lockstep=True)
+    with session:
+        SimEnvManager.first().set_lockstep(True)
+        cars = [RaceCar.find(name) for name in CARS]
+        dat = RaceCar.gather(["Speed", "Location", "Unknown"], cars)
+        assert dat.shape == (3, 3, 3) and dat.dtype == np.float32
+        assert np.array_equal(dat[:, 0, 0], [0, 10, 20])
+        assert np.array_equal(dat[:, 1], [[0, 0, 0], [1, 2, 3], [2, 4, 6]])
+        assert not dat[:, 2].any()
+        assert np.array_equal(RaceCar.gather("Speed")[:, 0, 0], [0, 10, 20])
+
+
+def test_scatter(loopback):
+    fleet = Fleet()
+    server, session = loopback(fleet, lockstep=True)
+    with session:
+        lvl = SimEnvManager.first()
+        lvl.set_lockstep(True)
+        cars = [RaceCar.find(name) for name in CARS]
+        RaceCar.scatter("setThrottle", cars, [0.25, 0.5, 0.75], kind="float")
+        RaceCar.scatter("setGear", cars, -1, kind="int")
+        RaceCar.scatter("setTarget", cars, np.arange(9).reshape(3, 3), kind="vector3d")
+        lvl.step()
+        for i, name in enumerate(CARS):
+            assert float(np.ravel(fleet.commands[f"RaceCar.{name}.setThrottle"])[0]) == 0.25 * (i + 1)
+            assert np.ravel(fleet.commands[f"RaceCar.{name}.setGear"]).view("<i4")[0] == -1
+            assert np.array_equal(np.ravel(fleet.commands[f"RaceCar.{name}.setTarget"]), [3 * i, 3 * i + 1, 3 * i + 2])
+
+        with pytest.raises(ValueError):
+            RaceCar.scatter("setThrottle", cars, [0.25, 0.5], kind="float")
+        with pytest.raises(ValueError):
+            RaceCar.scatter("setThrottle", cars, [0.25, 0.5, 0.75], kind="double")
+
+
+def test_frame_ring_views(loopback):
+    server, session = loopback(Fleet(), lockstep=True)
+    with session:
+        lvl = SimEnvManager.first()
+        lvl.set_lockstep(True)
+        cam = SmartCamera.find("cam")
+        lvl.step()
+        frame_id, view = cam.get_camera_frame_view()
+        assert np.array_equal(view, cam.get_camera_frame())
+        assert not view.flags.writeable
+        # no new frame, no new copy
+        assert cam.get_camera_frame_view()[0] == frame_id
+        assert cam.get_camera_frame_view()[1] is view
+
+        # other channel counts of the same property keep their own ring
+        gray_id, gray = cam._get_image_view("CameraFrame", 1)
+        assert gray.shape == view.shape[:2]
+        assert cam.get_camera_frame_view()[1] is view
+
+        before = view.copy()
+        lvl.step()
+        new_id, new_view = cam.get_camera_frame_view()
+        assert new_id == frame_id + 1
+        assert not np.array_equal(new_view, before)
+        assert np.array_equal(view, before)  # older views stay valid for a while
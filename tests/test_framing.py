@@ -0,0 +1,76 @@
+import numpy as np
+
+from pyjop.EntityBase import NPArray
+from pyjop.Network import FrameDecoder
+
+
+def make_frames():
+    return [
+        NPArray("SimEnvManager.Current.SimTime", np.asarray([1.5], dtype=np.float32)),
+        NPArray("SmartTracker.t0.Location", np.asarray([1, 2, 3], dtype=np.float32)),
+        NPArray("ConveyorBelt.belt0.Reset", np.asarray([], dtype=np.float32)),
+        NPArray("SmartCamera.cam.CameraFrame", np.arange(48 * 48 * 4, dtype=np.uint8).reshape(48, 48, 4)),
+        NPArray("RaceCar.car.Speed", np.asarray([7.0], dtype=np.float32)),
+    ]
+
+
+def assert_decoded(decoded, frames):
+    assert [arr.unique_name for arr in decoded] == [arr.unique_name for arr in frames]
+    for arr, sent in zip(decoded, frames):
+        if sent.array_data.size > 0:
+            assert np.array_equal(arr.array_data.reshape(-1), sent.array_data.reshape(-1))
+
+
+def test_frames_split_at_any_position():
+    frames = make_frames()
+    stream = b"".join(arr.pack_msg() for arr in frames)
+    step = 7  # every split position within the headers, some within the payloads
+    for first in range(0, len(stream), step):
+        for second in range(first, len(stream), 997):
+            decoder = FrameDecoder()
+            decoded = []
+            for chunk in (stream[:first], stream[first:second], stream[second:]):
+                decoded.extend(decoder.feed(bytearray(chunk)))
+            assert_decoded(decoded, frames)
+            assert decoder.skipped_bytes == 0
+
+
+def test_frames_fed_byte_by_byte():
+    frames = make_frames()[:3]
+    decoder = FrameDecoder()
+    decoded = []
+    for b in b"".join(arr.pack_msg() for arr in frames):
+        decoded.extend(decoder.feed(bytearray([b])))
+    assert_decoded(decoded, frames)
+
+
+def test_empty_frame_emitted_with_its_header():
+    decoder = FrameDecoder()
+    decoded = decoder.feed(bytearray(NPArray("ConveyorBelt.belt0.Reset", np.asarray([], dtype=np.float32)).pack_msg()))
+    assert [arr.unique_name for arr in decoded] == ["ConveyorBelt.belt0.Reset"]
+
+
+def test_resync_after_garbage():
+    frames = make_frames()
+    garbage = [b"\x00\x01garbage", b"xyz" * 50, NPArray._MAGIC_BYTES[:3]]
+    stream = garbage[0] + frames[0].pack_msg() + garbage[1] + frames[1].pack_msg() + garbage[2] + frames[4].pack_msg()
+    for split in range(0, len(stream), 5):
+        decoder = FrameDecoder()
+        decoded = decoder.feed(bytearray(stream[:split])) + decoder.feed(bytearray(stream[split:]))
+        assert_decoded(decoded, [frames[0], frames[1], frames[4]])
+        assert decoder.skipped_bytes == sum(len(g) for g in garbage)
+
+
+def test_large_payload_survives_buffer_reuse():
+    frames = make_frames()
+    big, small = frames[3], frames[0]
+    decoder = FrameDecoder()
+    decoded = []
+    for arr in (big, small, big):
+        data = arr.pack_msg()
+        buf = decoder.buffer()
+        buf[: len(data)] = data
+        decoded.extend(decoder.feed_buffer(len(data)))
+    # later receives must not overwrite frames decoded before
+    assert_decoded(decoded, [big, small, big])
+    assert decoded[0].array_data.nbytes > FrameDecoder.COPY_THRESHOLD
@@ -0,0 +1,85 @@
+import socket
+import threading
+import time
+
+from pyjop.EntityClasses import SimEnvManager, sleep
+from pyjop.Network import SimEnv
+
+
+def idle(sim_time, commands):
+    return dict()
+
+
+def test_sleep_follows_time_dilation(loopback):
+    server, session = loopback(idle, dt=1 / 60)
+    elapsed = dict()
+    with session:
+        lvl = SimEnvManager.first()
+        for dilation in (1.0, 4.0):
+            lvl.set_time_dilation(dilation)
+            sleep()
+            sleep(0.2)  # let the scheduler learn the new rate
+            start, start_sim = time.monotonic(), server.sim_time
+            sleep(1.0)
+            elapsed[dilation] = time.monotonic() - start
+            # woken within a tick or two of the target sim time
+            assert abs(server.sim_time - start_sim - 1.0) <= 2 * server.dt * dilation
+    assert elapsed[4.0] < elapsed[1.0] / 3
+
+
+def test_sleepers_wake_in_order(loopback):
+    server, session = loopback(idle, dt=1 / 60)
+    woken = []
+
+    def sleeper(seconds: float):
+        with session:
+            sleep(seconds)
+            woken.append((seconds, server.sim_time))
+
+    threads = [threading.Thread(target=sleeper, args=(s,)) for s in (0.6, 0.2, 0.4)]
+    start_sim = server.sim_time
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert [s for s, _ in woken] == [0.2, 0.4, 0.6]
+    for seconds, sim_time in woken:
+        assert abs(sim_time - start_sim - seconds) < 0.1
+
+
+def test_sleepers_released_on_disconnect(loopback):
+    server, session = loopback(idle, dt=1 / 60)
+    woken = []
+
+    def sleeper():
+        with session:
+            sleep(100)
+            woken.append(time.monotonic())
+
+    thread = threading.Thread(target=sleeper)
+    thread.start()
+    time.sleep(0.2)
+    start = time.monotonic()
+    with session:
+        SimEnv._client_socket.shutdown(socket.SHUT_RDWR)
+    thread.join(5)
+    assert woken and woken[0] - start < 1
+
+
+def test_lockstep_steps_exactly(loopback):
+    server, session = loopback(idle, lockstep=True)
+    with session:
+        lvl = SimEnvManager.first()
+        lvl.set_lockstep(True)
+        lvl.step()
+        ticks = server.ticks
+        sim_time = lvl.step(5)
+        assert server.ticks == ticks + 5
+        assert abs(sim_time - server.sim_time) < 1e-4
+        time.sleep(0.2)
+        assert server.ticks == ticks + 5  # paused until the next step
+
+        # leaving lockstep lets the server run at its own pace again
+        lvl.set_lockstep(False)
+        time.sleep(0.5)
+        assert server.ticks > ticks + 5 + 15
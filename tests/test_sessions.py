@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+from pyjop.EntityBase import EntityBase, Session
+from pyjop.EntityClasses import RaceCar, SimEnvManager, sleep
+from pyjop.Network import SimEnv
+
+
+class Car:
+    """step function for the LoopbackServer with one race car whose speed follows its throttle"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.throttle = 0.0
+
+    def __call__(self, sim_time, commands):
+        k = f"RaceCar.{self.name}.setThrottle"
+        if k in commands:
+            self.throttle = float(np.ravel(commands[k])[0])
+        return {f"RaceCar.{self.name}.Speed": [10 * self.throttle]}
+
+
+def test_sessions_are_independent(loopback):
+    cars = [Car("a"), Car("b")]
+    (server_a, session_a), (server_b, session_b) = [loopback(car, dt=1 / 60) for car in cars]
+
+    with session_a:
+        assert [car.entity_name for car in RaceCar.find_all()] == ["a"]
+        SimEnv.set_command_dedup(True)
+        RaceCar.find("a").set_throttle(0.5)
+    with session_b:
+        assert [car.entity_name for car in RaceCar.find_all()] == ["b"]
+        assert not EntityBase._dedup_enabled
+        RaceCar.find("b").set_throttle(0.25)
+
+    for session, name, speed in ((session_a, "a", 5.0), (session_b, "b", 2.5)):
+        with session:
+            deadline = time.monotonic() + 2
+            while RaceCar.find(name).get_speed() != speed and time.monotonic() < deadline:
+                sleep()
+            assert RaceCar.find(name).get_speed() == speed
+            assert SimEnvManager.first().get_sim_time() > 0
+    assert cars[0].throttle == 0.5 and cars[1].throttle == 0.25
+
+    # the stores and counters of one session are not visible from the other
+    assert session_a._entity_dict.keys() != session_b._entity_dict.keys()
+    assert "RaceCar.a.setThrottle" in session_a._out_time_dict
+    assert "RaceCar.a.setThrottle" not in session_b._out_time_dict
+    assert Session.current() is Session.default
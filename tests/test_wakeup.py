@@ -0,0 +1,94 @@
+import socket
+import threading
+import time
+
+import numpy as np
+
+from pyjop.EntityBase import EntityBase, NPArray, Session
+from pyjop.Network import FrameDecoder, SimEnv, SockAPIClient
+
+TICK_INTERVAL = 2.0  # slow ticks, commands must go out through the wakeup socket
+
+
+class SlowTickServer:
+    """stand-in SimEnv ticking every TICK_INTERVAL seconds that records when each setPing value arrived"""
+
+    def __init__(self) -> None:
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        self.arrivals = dict()
+        self.running = True
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        conn, _ = self.listener.accept()
+        decoder = FrameDecoder()
+        sim_time = 0.0
+        next_tick = 0.0
+        while self.running:
+            if time.monotonic() >= next_tick:
+                sim_time += TICK_INTERVAL
+                next_tick = time.monotonic() + TICK_INTERVAL
+                conn.sendall(NPArray("SimEnvManager.Current.SimTime", np.asarray([sim_time], dtype=np.float32)).pack_msg()
+                             + NPArray("SmartTracker.t0.Location", np.zeros(3, dtype=np.float32)).pack_msg())
+            conn.settimeout(max(0.001, next_tick - time.monotonic()))
+            try:
+                n = conn.recv_into(decoder.buffer())
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if n == 0:
+                break
+            for arr in decoder.feed_buffer(n):
+                if arr.unique_name == "SmartTracker.t0.setPing":
+                    self.arrivals.setdefault(arr.get_float(), time.monotonic())
+        conn.close()
+
+
+def send_ping(server: SlowTickServer, value: float, timeout: float = 2) -> float:
+    """seconds until a single command reached the server"""
+    t0 = time.monotonic()
+    EntityBase._set_out_data("SmartTracker.t0.setPing", NPArray("SmartTracker.t0.setPing", np.asarray([value], dtype=np.float32)))
+    while value not in server.arrivals and time.monotonic() - t0 < timeout:
+        time.sleep(0.0005)
+    return server.arrivals.get(value, time.monotonic()) - t0
+
+
+def test_wakeup_not_lost_under_contention():
+    server = SlowTickServer()
+    session = Session()
+    with session:
+        assert SimEnv.connect(port=server.port)
+        try:
+            def hammer(i: int, stop: float):
+                with session:
+                    k = f"SmartTracker.t0.setHammer{i}"
+                    n = 0
+                    while time.monotonic() < stop:
+                        SockAPIClient.wakeup()
+                        n += 1
+                        if n % 64 == 0:
+                            EntityBase._set_out_data(k, NPArray(k, np.asarray([n], dtype=np.float32)), append=True)
+
+            # every round gives the io thread many chances to drain a wakeup right after it was signalled
+            for _ in range(5):
+                stop = time.monotonic() + 0.3
+                threads = [threading.Thread(target=hammer, args=(i, stop)) for i in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            # wait until the server worked through the backlog
+            assert send_ping(server, -1.0, timeout=30) < 30
+            time.sleep(0.1)
+
+            latencies = [send_ping(server, float(i)) for i in range(20)]
+            assert max(latencies) < 0.1, latencies
+        finally:
+            server.running = False
+            SimEnv._client_socket.shutdown(socket.SHUT_RDWR)
+            EntityBase._receive_ticks.wait(EntityBase._receive_ticks.tick, 1)
+    session.close()